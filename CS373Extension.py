@@ -2,12 +2,27 @@ import math
 import sys
 from pathlib import Path
 
-from matplotlib import pyplot
-from matplotlib.patches import Polygon
-
 # import our basic, light-weight png reader library
 import imageIO.png
 
+# histogram based selection of the threshold value
+import adaptiveThreshold
+
+# convex hull and minimum area rectangle of the plate component
+import geometry
+
+# histogram equalization and CLAHE as alternatives to the min/max stretch of the greyscale image
+import equalization
+
+# projection profile check that skips the labeling of frames without a plate like band
+import projectionProfile
+
+# standard deviation, stretch and fixed threshold fused into one stage in the variance domain
+import varianceThreshold
+
+# plotting helpers, matplotlib itself is only imported once a figure or matplotlib output is requested
+import visualization
+
 # This is a queue class
 class Queue:
     def __init__(self):
@@ -269,12 +284,21 @@ def extractLargestLabel(connectedComponents_labels):
     connectedComponents_labels[largestComponentLabel] = 1
     return largestComponentLabel
 
+# the tunable parameters of the extension and their default values, all of them are keyword arguments of detectLicensePlate
+# boxFitting selects how a rotated plate outline is computed: "calipers" fits the minimum area rectangle around the
+# convex hull of the component, "extremes" connects the extreme points of the component like the original version.
+# contrast is the enhancement of the greyscale image before the standard deviation, see computeStretchedStandardDeviationImage.
+# minBandPixels is the foreground pixel count a row needs to be part of a plate like band, a frame without such a
+# band has no plate. 0 switches the check off and labels the whole image
+DEFAULT_PARAMETERS = {"thresholdValue": 150, "closingIterations": 4, "ratioMin": 0.2, "ratioMax": 5, "angleVariance": 1.08,
+                      "boxFitting": "calipers", "contrast": "stretch", "minBandPixels": 20}
+
 # Check box ratio
-def boxHasExpectedRatio(points):
+def boxHasExpectedRatio(points, ratioMin = 0.2, ratioMax = 5):
     xSize = points[2][0] - points[0][0]
     ySize = points[3][1] - points[1][1]
     ratio = xSize/ySize
-    if(0.2<=ratio and ratio<=5):
+    if(ratioMin<=ratio and ratio<=ratioMax):
         return True
     else:
         return False
@@ -330,6 +354,177 @@ def getRotation(points):
     angle = math.degrees((line1Angle+line2Angle)/2)
     return angle
 
+# Collects the left and right boundary pixels of some components in a single scan of the labelled image,
+# returns a dict from label to a list of [y, min_x, max_x], one entry per row the component covers
+def computeComponentRowExtents(connectedComponents_array, image_width, image_height, componentLabels):
+    extents = {label: [] for label in componentLabels}
+    for y in range(image_height):
+        row = connectedComponents_array[y]
+        row_extents = {}
+        for x in range(image_width):
+            if row[x] in extents:
+                if row[x] in row_extents:
+                    row_extents[row[x]][2] = x
+                else:
+                    row_extents[row[x]] = [y, x, x]
+        for label, extent in row_extents.items():
+            extents[label].append(extent)
+    return extents
+
+# The same points as computeBoundaryBoxBoundsClockwise, taken from the row extents of the component instead of the image
+def computeExtremePointsFromRowExtents(rowExtents, image_width, image_height):
+    points = [[image_width, 0], [0, image_height], [0, 0], [0, 0]]
+    if rowExtents == []:
+        return points
+    min_x = min(extent[1] for extent in rowExtents)
+    max_x = max(extent[2] for extent in rowExtents)
+    # leftmost pixel furthest down, topmost pixel furthest left, rightmost pixel furthest up, lowest pixel furthest right
+    points[0] = [min_x, max(extent[0] for extent in rowExtents if extent[1] == min_x)]
+    points[1] = [rowExtents[0][1], rowExtents[0][0]]
+    points[2] = [max_x, min(extent[0] for extent in rowExtents if extent[2] == max_x)]
+    points[3] = [rowExtents[-1][2], rowExtents[-1][0]]
+    return points
+
+# Fits the minimum area rectangle around the boundary pixels of a component, returns its corners as integer points
+# starting with the leftmost corner (in the same order as the extreme points) and the angle of its long side in degrees
+def computeRotatedBoundaryBox(rowExtents):
+    boundary = []
+    for y, min_x, max_x in rowExtents:
+        boundary.append((min_x, y))
+        boundary.append((max_x, y))
+    corners = geometry.computeMinimumAreaRectangle(geometry.computeConvexHull(boundary))
+    corners = geometry.orientCounterclockwise(corners)
+    first = min(range(4), key=lambda i: (round(corners[i][0], 6), -corners[i][1]))
+    corners = corners[first:] + corners[:first]
+
+    side1 = (corners[1][0] - corners[0][0], corners[1][1] - corners[0][1])
+    side2 = (corners[3][0] - corners[0][0], corners[3][1] - corners[0][1])
+    dx, dy = side1 if math.hypot(*side1) >= math.hypot(*side2) else side2
+    if dx < 0 or (dx == 0 and dy < 0):
+        dx, dy = -dx, -dy
+    rotation = math.degrees(math.atan2(dy, dx))
+    return [[int(round(x)), int(round(y))] for x, y in corners], rotation
+
+# Enhances the contrast of a greyscale image: "stretch" (min/max), "equalize" or "clahe"
+def computeContrastEnhancedImage(px_array, image_width, image_height, contrast = "stretch"):
+    if contrast == "stretch":
+        return scaleTo0And255AndQuantize(px_array, image_width, image_height)
+    return equalization.computeContrastEnhancement(px_array, image_width, image_height, contrast)
+
+# Computes the 5x5 standard deviation of a greyscale image, both contrast stretched to 0..255.
+# contrast selects how the greyscale image is enhanced first: "stretch" (min/max), "equalize" or "clahe"
+def computeStretchedStandardDeviationImage(px_array, image_width, image_height, contrast = "stretch"):
+    px_array = computeContrastEnhancedImage(px_array, image_width, image_height, contrast)
+    px_array = computeStandardDeviationImage5x5(px_array, image_width, image_height)
+    return scaleTo0And255AndQuantize(px_array, image_width, image_height)
+
+# Computes the thresholded stretched standard deviation image of a greyscale image, a fixed threshold in one pass
+# through varianceThreshold, an adaptive one from the histogram of the stretched standard deviation image
+def computeEdgeImage(px_array, image_width, image_height, thresholdValue = 150, contrast = "stretch"):
+    if adaptiveThreshold.isAdaptiveThreshold(thresholdValue):
+        px_array = computeStretchedStandardDeviationImage(px_array, image_width, image_height, contrast)
+        histogram = adaptiveThreshold.computeHistogram256(px_array, image_width, image_height)
+        thresholdValue = adaptiveThreshold.resolveThreshold(thresholdValue, histogram)
+        return computeThresholdGE(px_array, thresholdValue, image_width, image_height)
+    px_array = computeContrastEnhancedImage(px_array, image_width, image_height, contrast)
+    return varianceThreshold.computeVarianceThresholdGE(px_array, thresholdValue, image_width, image_height)
+
+# Runs the stages after the standard deviation on the stretched standard deviation image (which is overwritten)
+# and returns the four plate boundary points and the rotation of the plate in degrees, the rotation is None if
+# a basic bounding box was used. thresholdValue is a fixed value or "otsu" / "p<percentile>". Both are None if the
+# projection profile check found no plate like band.
+def detectLicensePlateFromStandardDeviationImage(px_array, image_width, image_height, thresholdValue = 150, closingIterations = 4, ratioMin = 0.2, ratioMax = 5, angleVariance = 1.08, boxFitting = "calipers", minBandPixels = 20):
+
+    if adaptiveThreshold.isAdaptiveThreshold(thresholdValue):
+        histogram = adaptiveThreshold.computeHistogram256(px_array, image_width, image_height)
+        thresholdValue = adaptiveThreshold.resolveThreshold(thresholdValue, histogram)
+    px_array = computeThresholdGE(px_array, thresholdValue, image_width, image_height)
+    return detectLicensePlateFromEdgeImage(px_array, image_width, image_height, closingIterations, ratioMin, ratioMax, angleVariance, boxFitting, minBandPixels)
+
+# Runs the stages after the threshold on the binary edge image (which is overwritten) and returns the plate boundary
+# points and rotation like detectLicensePlateFromStandardDeviationImage
+def detectLicensePlateFromEdgeImage(px_array, image_width, image_height, closingIterations = 4, ratioMin = 0.2, ratioMax = 5, angleVariance = 1.08, boxFitting = "calipers", minBandPixels = 20):
+
+    # dilation and erosion computed closingIterations times
+    for x in range(closingIterations):
+        px_array = computeDilation8Nbh3x3FlatSE(px_array, image_width, image_height)
+    for x in range(closingIterations):
+        px_array = computeErosion8Nbh3x3FlatSE(px_array, image_width, image_height)
+
+    connectedComponents_array, connectedComponents_labels = projectionProfile.computeProfileCheckedLabeling(px_array, image_width, image_height, minBandPixels,
+                                                                                                          computeConnectedComponentLabeling, colourConnectedComponents)
+    if len(connectedComponents_labels) == 1:
+        return None, None
+
+    return selectPlateBoundary(connectedComponents_array, connectedComponents_labels, image_width, image_height, ratioMin, ratioMax, angleVariance, boxFitting)
+
+# Picks the plate component from the labelled image and computes its boundary points and rotation,
+# connectedComponents_labels is modified while the largest labels are extracted
+def selectPlateBoundary(connectedComponents_array, connectedComponents_labels, image_width, image_height, ratioMin = 0.2, ratioMax = 5, angleVariance = 1.08, boxFitting = "calipers"):
+
+    if boxFitting == "calipers":
+        return selectPlateBoundaryCalipers(connectedComponents_array, connectedComponents_labels, image_width, image_height, ratioMin, ratioMax, angleVariance)
+    if boxFitting != "extremes":
+        raise ValueError("unknown boxFitting {}, expected calipers or extremes".format(boxFitting))
+
+    # Find label with largest size and compute a bounding box
+    largestComponentLabel = extractLargestLabel(connectedComponents_labels)
+    boundaryPoints = computeBoundaryBoxBoundsClockwise(image_width, image_height, connectedComponents_array, largestComponentLabel)
+    
+    #attempt to find a bounding box with correct ratio 3 times
+    if not (boxHasExpectedRatio(boundaryPoints, ratioMin, ratioMax)):
+        for i in range(3):
+            tempLabel = extractLargestLabel(connectedComponents_labels)
+            tempPoints = computeBoundaryBoxBoundsClockwise(image_width, image_height, connectedComponents_array, tempLabel)
+            if(boxHasExpectedRatio(tempPoints, ratioMin, ratioMax)):
+                largestComponentLabel = tempLabel
+                boundaryPoints = tempPoints
+                break        
+
+    # Compute optimal boundary box
+    rotation = None
+    if(boundaryAnglesInvalid(boundaryPoints,angleVariance)):
+        boundaryPoints = makeBasicBoundaryBox(boundaryPoints)
+    else:
+        if (getRotation(boundaryPoints) < 0):
+            boundaryPoints = computeBoundaryBoxBoundsCounterclockwise(image_width, image_height, connectedComponents_array, largestComponentLabel)
+        rotation = getRotation(boundaryPoints)
+
+    return boundaryPoints, rotation
+
+# Same selection as selectPlateBoundary, but the boundary pixels of the 4 largest components are collected in one
+# scan of the labelled image and a rotated plate is outlined by the minimum area rectangle around the convex hull of
+# its component, which gives the same angle whichever way the plate is rotated
+def selectPlateBoundaryCalipers(connectedComponents_array, connectedComponents_labels, image_width, image_height, ratioMin = 0.2, ratioMax = 5, angleVariance = 1.08):
+
+    candidateLabels = [extractLargestLabel(connectedComponents_labels) for i in range(4)]
+    rowExtents = computeComponentRowExtents(connectedComponents_array, image_width, image_height, candidateLabels)
+
+    # the largest component, or the next largest one with the expected ratio
+    largestComponentLabel = candidateLabels[0]
+    boundaryPoints = computeExtremePointsFromRowExtents(rowExtents[largestComponentLabel], image_width, image_height)
+    if not (boxHasExpectedRatio(boundaryPoints, ratioMin, ratioMax)):
+        for tempLabel in candidateLabels[1:]:
+            tempPoints = computeExtremePointsFromRowExtents(rowExtents[tempLabel], image_width, image_height)
+            if(boxHasExpectedRatio(tempPoints, ratioMin, ratioMax)):
+                largestComponentLabel = tempLabel
+                boundaryPoints = tempPoints
+                break
+
+    # components whose extreme points don't form a rough rectangle get a basic bounding box
+    if(boundaryAnglesInvalid(boundaryPoints,angleVariance)):
+        return makeBasicBoundaryBox(boundaryPoints), None
+    return computeRotatedBoundaryBox(rowExtents[largestComponentLabel])
+
+# Runs the detection pipeline on the r,g,b pixel arrays and returns the four plate boundary points
+# and the rotation of the plate in degrees, the rotation is None if a basic bounding box was used
+def detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height, thresholdValue = 150, closingIterations = 4, ratioMin = 0.2, ratioMax = 5, angleVariance = 1.08, boxFitting = "calipers", contrast = "stretch", minBandPixels = 20):
+
+    px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+    px_array = computeEdgeImage(px_array, image_width, image_height, thresholdValue, contrast)
+
+    return detectLicensePlateFromEdgeImage(px_array, image_width, image_height, closingIterations, ratioMin, ratioMax, angleVariance, boxFitting, minBandPixels)
+
 # This is our code skeleton that performs the license plate detection.
 # Feel free to try it on your own images of cars, but keep in mind that with our algorithm developed in this lecture,
 # we won't detect arbitrary or difficult to detect license plates!
@@ -337,6 +532,14 @@ def main():
 
     command_line_arguments = sys.argv[1:]
 
+    # --plain-output writes the output image with imageIO.png instead of rendering it with matplotlib
+    PLAIN_OUTPUT = "--plain-output" in command_line_arguments
+    command_line_arguments = [argument for argument in command_line_arguments if argument != "--plain-output"]
+
+    # --plate-crop also writes an upright, fixed size crop of the plate next to the output image as <name>_plate.png
+    PLATE_CROP = "--plate-crop" in command_line_arguments
+    command_line_arguments = [argument for argument in command_line_arguments if argument != "--plate-crop"]
+
     SHOW_DEBUG_FIGURES = True
 
     # this is the default input image filename
@@ -360,75 +563,33 @@ def main():
     # each pixel array contains 8 bit integer values between 0 and 255 encoding the color values
     (image_width, image_height, px_array_r, px_array_g, px_array_b) = readRGBImageToSeparatePixelArrays(input_filename)
 
-    # setup the plots for intermediate results in a figure
-    fig1, axs1 = pyplot.subplots(2, 2)
-    axs1[0, 0].set_title('Input red channel of image')
-    axs1[0, 0].imshow(px_array_r, cmap='gray')
-    axs1[0, 1].set_title('Input green channel of image')
-    axs1[0, 1].imshow(px_array_g, cmap='gray')
-    axs1[1, 0].set_title('Input blue channel of image')
-    axs1[1, 0].imshow(px_array_b, cmap='gray')
-
-
     # STUDENT IMPLEMENTATION here
 
-    px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
-    px_array = scaleTo0And255AndQuantize(px_array, image_width, image_height)
-    px_array = computeStandardDeviationImage5x5(px_array, image_width, image_height)
-    px_array = scaleTo0And255AndQuantize(px_array, image_width, image_height)
-    thresholdValue = 150
-    px_array = computeThresholdGE(px_array, thresholdValue, image_width, image_height)
-    # dilation and erosion computed 4 times
-    for x in range(4):
-        px_array = computeDilation8Nbh3x3FlatSE(px_array, image_width, image_height)
-    for x in range(4):
-        px_array = computeErosion8Nbh3x3FlatSE(px_array, image_width, image_height)
-
-
-    connectedComponents_array, connectedComponents_labels = computeConnectedComponentLabeling(px_array, image_width, image_height)
-
-
-    # Find label with largest size and compute a bounding box
-    largestComponentLabel = extractLargestLabel(connectedComponents_labels)
-    boundaryPoints = computeBoundaryBoxBoundsClockwise(image_width, image_height, connectedComponents_array, largestComponentLabel)
-    
-    #attempt to find a bounding box with correct ratio 3 times
-    if not (boxHasExpectedRatio(boundaryPoints)):
-        for i in range(3):
-            tempLabel = extractLargestLabel(connectedComponents_labels)
-            tempPoints = computeBoundaryBoxBoundsClockwise(image_width, image_height, connectedComponents_array, tempLabel)
-            if(boxHasExpectedRatio(tempPoints)):
-                largestComponentLabel = tempLabel
-                boundaryPoints = tempPoints
-                break        
+    boundaryPoints, rotation = detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height)
 
     px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
 
-    # Compute optimal boundary box
-    if(boundaryAnglesInvalid(boundaryPoints,1.08)):
-        boundaryPoints = makeBasicBoundaryBox(boundaryPoints)
-    else:
-        if (getRotation(boundaryPoints) < 0):
-            boundaryPoints = computeBoundaryBoxBoundsCounterclockwise(image_width, image_height, connectedComponents_array, largestComponentLabel)
-        
-        print("The rotation of the liscense plate is: " + str(round(getRotation(boundaryPoints),1)) + " degrees")
-        
-
-    # Draw a bounding box as a rectangle into the input image
-    axs1[1, 1].set_title('Final image of detection')
-    axs1[1, 1].imshow(px_array, cmap='gray')
-    rect = Polygon(boundaryPoints, linewidth=1, closed=True, edgecolor='g', facecolor='none')
-    axs1[1, 1].add_patch(rect)
+    if rotation is not None:
+        print("The rotation of the liscense plate is: " + str(round(rotation,1)) + " degrees")
 
+    polygons = [boundaryPoints]
+    if boundaryPoints is None:
+        print("No licence plate found")
+        polygons = []
 
+    if PLATE_CROP and boundaryPoints is not None:
+        import rectification
+        corners = rectification.orderPlateCorners(boundaryPoints, rotation)
+        crop = rectification.computePlateCrop(px_array_r, px_array_g, px_array_b, image_width, image_height, corners)
+        crop_filename = output_filename.with_name(output_filename.stem.replace("_output", "") + "_plate.png")
+        rectification.writePlateCrop(crop, rectification.DEFAULT_CROP_WIDTH, rectification.DEFAULT_CROP_HEIGHT, crop_filename)
 
-    # write the output image into output_filename, using the matplotlib savefig method
-    extent = axs1[1, 1].get_window_extent().transformed(fig1.dpi_scale_trans.inverted())
-    pyplot.savefig(output_filename, bbox_inches=extent, dpi=600)
-
-    if SHOW_DEBUG_FIGURES:
-        # plot the current figure
-        pyplot.show()
+    if PLAIN_OUTPUT and not SHOW_DEBUG_FIGURES:
+        visualization.writeDetectionPNG(px_array, image_width, image_height, output_filename, polygons)
+    else:
+        # Draw the boundary polygon into the input image and write it using the matplotlib savefig method
+        visualization.saveDetectionFigure(px_array_r, px_array_g, px_array_b, px_array, output_filename, SHOW_DEBUG_FIGURES,
+                                          polygons=polygons)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
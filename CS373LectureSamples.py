@@ -3,6 +3,9 @@ from matplotlib import pyplot
 # import our basic, light-weight png reader library
 import imageIO.png
 
+# value counts, cumulative and streaming histograms
+import histogram
+
 # this function reads an RGB color png file and returns width, height, as well as pixel arrays for r,g,b
 def readRGBImageToSeparatePixelArrays(input_filename):
     image_reader = imageIO.png.Reader(filename=input_filename)
@@ -50,18 +53,9 @@ def createInitializedGreyscalePixelArray(image_width, image_height, initValue =
 
 
 
+# Histogram of pixel_array with nr_bins equally wide bins over the 8 bit value range
 def computeHistogram(pixel_array, image_width, image_height, nr_bins):
-
-    histogram = [0.0 for i in range(nr_bins)]
-
-    # your task to compute the correct histogram!
-
-    # incorrect histogram
-    histogram[0] = 10
-    histogram[32] = 15
-    histogram[63] = 10
-
-    return histogram
+    return histogram.computeHistogram(pixel_array, image_width, image_height, nr_bins)
 
 
 def main():
@@ -77,10 +71,10 @@ def main():
     axs1[0].imshow(pixel_array, cmap='gray')
 
     nr_bins = 64
-    dummy_histogram = computeHistogram(pixel_array, image_width, image_height, nr_bins)
+    channel_histogram = computeHistogram(pixel_array, image_width, image_height, nr_bins)
 
     axs1[1].set_title('Histogram')
-    axs1[1].bar(range(nr_bins), dummy_histogram)
+    axs1[1].bar(range(nr_bins), channel_histogram)
 
     pyplot.show()
 
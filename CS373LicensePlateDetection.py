@@ -1,13 +1,29 @@
+import itertools
 import math
 import sys
 from pathlib import Path
 
-from matplotlib import pyplot
-from matplotlib.patches import Rectangle
-
 # import our basic, light-weight png reader library
 import imageIO.png
 
+# histogram based selection of the threshold value
+import adaptiveThreshold
+
+# scoring and ranking of the connected components
+import plateCandidates
+
+# histogram equalization and CLAHE as alternatives to the min/max stretch of the greyscale image
+import equalization
+
+# projection profile check that skips the labeling of frames without a plate like band
+import projectionProfile
+
+# standard deviation, stretch and fixed threshold fused into one stage in the variance domain
+import varianceThreshold
+
+# plotting helpers, matplotlib itself is only imported once a figure or matplotlib output is requested
+import visualization
+
 # This is a queue class
 class Queue:
     def __init__(self):
@@ -247,16 +263,161 @@ def extractLargestLabel(connectedComponents_labels):
     connectedComponents_labels[largestComponentLabel] = 1
     return largestComponentLabel
 
+# the tunable parameters of the detection and their default values, all of them are keyword arguments of detectLicensePlate
+# contrast is the enhancement of the greyscale image before the standard deviation, see computeStretchedStandardDeviationImage
+# minBandPixels is the foreground pixel count a row needs to be part of a plate like band, a frame without such a
+# band has no plate. 0 switches the check off and labels the whole image
+DEFAULT_PARAMETERS = {"thresholdValue": 150, "closingIterations": 4, "ratioMin": 2, "ratioMax": 5, "contrast": "stretch",
+                      "minBandPixels": 20}
+
 # Check box ratio
-def boxHasExpectedRatio(min_x, max_x, min_y, max_y):
+def boxHasExpectedRatio(min_x, max_x, min_y, max_y, ratioMin = 2, ratioMax = 5):
     xSize = max_x - min_x
     ySize = max_y - min_y
     ratio = xSize/ySize
-    if(2<=ratio and ratio<=5):
+    if(ratioMin<=ratio and ratio<=ratioMax):
         return True
     else:
         return False
 
+# Enhances the contrast of a greyscale image: "stretch" (min/max), "equalize" or "clahe"
+def computeContrastEnhancedImage(px_array, image_width, image_height, contrast = "stretch"):
+    if contrast == "stretch":
+        return scaleTo0And255AndQuantize(px_array, image_width, image_height)
+    return equalization.computeContrastEnhancement(px_array, image_width, image_height, contrast)
+
+# Computes the 5x5 standard deviation of a greyscale image, both contrast stretched to 0..255.
+# contrast selects how the greyscale image is enhanced first: "stretch" (min/max), "equalize" or "clahe"
+def computeStretchedStandardDeviationImage(px_array, image_width, image_height, contrast = "stretch"):
+    px_array = computeContrastEnhancedImage(px_array, image_width, image_height, contrast)
+    px_array = computeStandardDeviationImage5x5(px_array, image_width, image_height)
+    return scaleTo0And255AndQuantize(px_array, image_width, image_height)
+
+# Computes the thresholded stretched standard deviation image of a greyscale image. A fixed threshold is applied
+# in the variance domain by varianceThreshold in one pass, with the same result as the three separate stages,
+# an adaptive threshold needs the histogram of the stretched standard deviation image and runs them one by one.
+def computeEdgeImage(px_array, image_width, image_height, thresholdValue = 150, contrast = "stretch"):
+    if adaptiveThreshold.isAdaptiveThreshold(thresholdValue):
+        px_array = computeStretchedStandardDeviationImage(px_array, image_width, image_height, contrast)
+        return computeAdaptiveThresholdGE(px_array, thresholdValue, image_width, image_height)
+    px_array = computeContrastEnhancedImage(px_array, image_width, image_height, contrast)
+    return varianceThreshold.computeVarianceThresholdGE(px_array, thresholdValue, image_width, image_height)
+
+# Thresholds the stretched standard deviation image in place, thresholdValue is a fixed value or
+# "otsu" / "p<percentile>" to derive it from the image histogram
+def computeAdaptiveThresholdGE(px_array, thresholdValue, image_width, image_height):
+    if adaptiveThreshold.isAdaptiveThreshold(thresholdValue):
+        histogram = adaptiveThreshold.computeHistogram256(px_array, image_width, image_height)
+        thresholdValue = adaptiveThreshold.resolveThreshold(thresholdValue, histogram)
+    return computeThresholdGE(px_array, thresholdValue, image_width, image_height)
+
+# Closes the holes between the high contrast regions by computing the dilation and then the erosion iterations times
+def computeClosing8Nbh3x3FlatSE(px_array, image_width, image_height, iterations = 4):
+    for x in range(iterations):
+        px_array = computeDilation8Nbh3x3FlatSE(px_array, image_width, image_height)
+    for x in range(iterations):
+        px_array = computeErosion8Nbh3x3FlatSE(px_array, image_width, image_height)
+    return px_array
+
+# Runs the pipeline up to the connected component labeling, returns the thresholded standard deviation image,
+# the labelled image and the list of component sizes
+def computePlateComponents(px_array_r, px_array_g, px_array_b, image_width, image_height, thresholdValue = 150, closingIterations = 4, contrast = "stretch"):
+    px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+    edge_array = computeEdgeImage(px_array, image_width, image_height, thresholdValue, contrast)
+    return computeComponentsFromEdges(edge_array, image_width, image_height, closingIterations)
+
+# Closes the thresholded standard deviation image and labels it, returns the edge image, the labelled image
+# and the list of component sizes. With minBandPixels only components touching a plate like band are labelled,
+# see projectionProfile.computeProfileCheckedLabeling
+def computeComponentsFromEdges(edge_array, image_width, image_height, closingIterations = 4, minBandPixels = 0):
+    px_array = computeClosing8Nbh3x3FlatSE(edge_array, image_width, image_height, closingIterations)
+    connectedComponents_array, connectedComponents_labels = computeProfileCheckedLabeling(px_array, image_width, image_height, minBandPixels)
+    return edge_array, connectedComponents_array, connectedComponents_labels
+
+# Labels the closed image, only the components touching a plate like band if minBandPixels is above 0
+def computeProfileCheckedLabeling(px_array, image_width, image_height, minBandPixels = 0):
+    return projectionProfile.computeProfileCheckedLabeling(px_array, image_width, image_height, minBandPixels,
+                                                           computeConnectedComponentLabeling, colourConnectedComponents)
+
+# Picks the plate from the component statistics: the largest component, or the first of the next 3 largest
+# components with the expected ratio if the largest one doesn't have it
+def selectPlateBoundingBox(stats, connectedComponents_labels, ratioMin = 2, ratioMax = 5):
+    labelsBySize = plateCandidates.iterateLabelsBySize(connectedComponents_labels)
+    largestComponentLabel = next(labelsBySize, 0)
+    bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y = plateCandidates.statisticsBoundingBox(stats[largestComponentLabel])
+
+    if not (boxHasExpectedRatio(bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y, ratioMin, ratioMax)):
+        for tempLabel in itertools.islice(labelsBySize, 3):
+            min_x, max_x, min_y, max_y = plateCandidates.statisticsBoundingBox(stats[tempLabel])
+            if(boxHasExpectedRatio(min_x, max_x, min_y, max_y, ratioMin, ratioMax)):
+                bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y = min_x, max_x, min_y, max_y
+                break
+
+    return bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y
+
+# Runs the stages after the standard deviation on the stretched standard deviation image (which is overwritten)
+# and returns the plate bounding box as min_x, max_x, min_y, max_y
+def detectLicensePlateFromStandardDeviationImage(std_dev_array, image_width, image_height, thresholdValue = 150, closingIterations = 4, ratioMin = 2, ratioMax = 5, minBandPixels = 20):
+
+    edge_array = computeAdaptiveThresholdGE(std_dev_array, thresholdValue, image_width, image_height)
+    return detectLicensePlateFromEdgeImage(edge_array, image_width, image_height, closingIterations, ratioMin, ratioMax, minBandPixels)
+
+# Runs the stages after the threshold on the binary edge image and returns the plate bounding box
+# as min_x, max_x, min_y, max_y
+def detectLicensePlateFromEdgeImage(edge_array, image_width, image_height, closingIterations = 4, ratioMin = 2, ratioMax = 5, minBandPixels = 20):
+
+    edge_array, connectedComponents_array, connectedComponents_labels = computeComponentsFromEdges(edge_array, image_width, image_height, closingIterations, minBandPixels)
+
+    # no plate like band, nothing was labelled
+    if len(connectedComponents_labels) == 1:
+        return image_width, 0, image_height, 0
+
+    # bounding boxes of all components are computed in one pass instead of one image scan per tried label
+    stats = plateCandidates.computeComponentStatistics(connectedComponents_array, len(connectedComponents_labels) - 1, image_width, image_height)
+
+    return selectPlateBoundingBox(stats, connectedComponents_labels, ratioMin, ratioMax)
+
+# Runs the detection pipeline on the r,g,b pixel arrays and returns the plate bounding box as min_x, max_x, min_y, max_y
+def detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height, thresholdValue = 150, closingIterations = 4, ratioMin = 2, ratioMax = 5, contrast = "stretch", minBandPixels = 20):
+
+    px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+    edge_array = computeEdgeImage(px_array, image_width, image_height, thresholdValue, contrast)
+
+    return detectLicensePlateFromEdgeImage(edge_array, image_width, image_height, closingIterations, ratioMin, ratioMax, minBandPixels)
+
+# Runs the detection pipeline and returns up to top_k plate candidates, best first, for frames with several vehicles.
+# Every component is scored on its area, aspect ratio, fill ratio and edge density, see plateCandidates.rankPlateCandidates
+def detectLicensePlateCandidates(px_array_r, px_array_g, px_array_b, image_width, image_height, top_k, thresholdValue = 150, closingIterations = 4, contrast = "stretch"):
+
+    edge_array, connectedComponents_array, connectedComponents_labels = computePlateComponents(px_array_r, px_array_g, px_array_b, image_width, image_height, thresholdValue, closingIterations, contrast)
+    stats = plateCandidates.computeComponentStatistics(connectedComponents_array, len(connectedComponents_labels) - 1, image_width, image_height, edge_array)
+
+    return plateCandidates.rankPlateCandidates(stats, top_k)
+
+# Keeps the stretched standard deviation image of one frame and its histogram, so that several thresholds can be
+# evaluated without recomputing the greyscale, stretch and standard deviation stages
+class ThresholdEvaluator:
+    def __init__(self, px_array_r, px_array_g, px_array_b, image_width, image_height):
+        self.image_width = image_width
+        self.image_height = image_height
+        px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+        self.std_dev_array = computeStretchedStandardDeviationImage(px_array, image_width, image_height)
+        self.histogram = adaptiveThreshold.computeHistogram256(self.std_dev_array, image_width, image_height)
+
+    # the threshold value for a fixed value, "otsu" or "p<percentile>"
+    def thresholdFor(self, thresholdValue):
+        return adaptiveThreshold.resolveThreshold(thresholdValue, self.histogram)
+
+    # the binary image for a threshold, the cached standard deviation image is left untouched
+    def threshold(self, thresholdValue):
+        px_array = [list(row) for row in self.std_dev_array]
+        return computeThresholdGE(px_array, self.thresholdFor(thresholdValue), self.image_width, self.image_height)
+
+    # runs only the stages after the threshold and returns the plate bounding box
+    def detect(self, thresholdValue, closingIterations = 4, ratioMin = 2, ratioMax = 5):
+        px_array = [list(row) for row in self.std_dev_array]
+        return detectLicensePlateFromStandardDeviationImage(px_array, self.image_width, self.image_height, self.thresholdFor(thresholdValue), closingIterations, ratioMin, ratioMax)
+
 # This is our code skeleton that performs the license plate detection.
 # Feel free to try it on your own images of cars, but keep in mind that with our algorithm developed in this lecture,
 # we won't detect arbitrary or difficult to detect license plates!
@@ -264,6 +425,38 @@ def main():
 
     command_line_arguments = sys.argv[1:]
 
+    # --plain-output writes the output image with imageIO.png instead of rendering it with matplotlib
+    PLAIN_OUTPUT = "--plain-output" in command_line_arguments
+    command_line_arguments = [argument for argument in command_line_arguments if argument != "--plain-output"]
+
+    # --candidates K reports the K best plate candidates instead of a single plate
+    TOP_K = None
+    if "--candidates" in command_line_arguments:
+        index = command_line_arguments.index("--candidates")
+        TOP_K = int(command_line_arguments[index + 1])
+        del command_line_arguments[index:index + 2]
+
+    # --pyramid LEVELS finds the plate at a resolution downsampled LEVELS times and refines it at full resolution
+    PYRAMID_LEVELS = None
+    if "--pyramid" in command_line_arguments:
+        index = command_line_arguments.index("--pyramid")
+        PYRAMID_LEVELS = int(command_line_arguments[index + 1])
+        del command_line_arguments[index:index + 2]
+
+    # --threshold VALUE sets the std dev threshold, either a number (default 150), otsu or p<percentile> like p90
+    THRESHOLD_VALUE = 150
+    if "--threshold" in command_line_arguments:
+        index = command_line_arguments.index("--threshold")
+        THRESHOLD_VALUE = adaptiveThreshold.parseThreshold(command_line_arguments[index + 1])
+        del command_line_arguments[index:index + 2]
+
+    # --contrast METHOD enhances the greyscale image with stretch (default), equalize or clahe, e.g. for night frames
+    CONTRAST = "stretch"
+    if "--contrast" in command_line_arguments:
+        index = command_line_arguments.index("--contrast")
+        CONTRAST = command_line_arguments[index + 1]
+        del command_line_arguments[index:index + 2]
+
     SHOW_DEBUG_FIGURES = True
 
     # this is the default input image filename
@@ -287,65 +480,35 @@ def main():
     # each pixel array contains 8 bit integer values between 0 and 255 encoding the color values
     (image_width, image_height, px_array_r, px_array_g, px_array_b) = readRGBImageToSeparatePixelArrays(input_filename)
 
-    # setup the plots for intermediate results in a figure
-    fig1, axs1 = pyplot.subplots(2, 2)
-    axs1[0, 0].set_title('Input red channel of image')
-    axs1[0, 0].imshow(px_array_r, cmap='gray')
-    axs1[0, 1].set_title('Input green channel of image')
-    axs1[0, 1].imshow(px_array_g, cmap='gray')
-    axs1[1, 0].set_title('Input blue channel of image')
-    axs1[1, 0].imshow(px_array_b, cmap='gray')
-
-
     # STUDENT IMPLEMENTATION here
 
-    px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
-    px_array = scaleTo0And255AndQuantize(px_array, image_width, image_height)
-    px_array = computeStandardDeviationImage5x5(px_array, image_width, image_height)
-    px_array = scaleTo0And255AndQuantize(px_array, image_width, image_height)
-    thresholdValue = 150
-    px_array = computeThresholdGE(px_array, thresholdValue, image_width, image_height)
-    # dilation and erosion computed 4 times
-    for x in range(4):
-        px_array = computeDilation8Nbh3x3FlatSE(px_array, image_width, image_height)
-    for x in range(4):
-        px_array = computeErosion8Nbh3x3FlatSE(px_array, image_width, image_height)
-
-    connectedComponents_array, connectedComponents_labels = computeConnectedComponentLabeling(px_array, image_width, image_height)
+    if TOP_K is None and PYRAMID_LEVELS is not None:
+        import pyramid
+        bboxes = [pyramid.detectLicensePlatePyramid(px_array_r, px_array_g, px_array_b, image_width, image_height, PYRAMID_LEVELS,
+                                                    thresholdValue=THRESHOLD_VALUE, contrast=CONTRAST)]
+    elif TOP_K is None:
+        bboxes = [detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height, THRESHOLD_VALUE, contrast=CONTRAST)]
+    else:
+        candidates = detectLicensePlateCandidates(px_array_r, px_array_g, px_array_b, image_width, image_height, TOP_K, THRESHOLD_VALUE, contrast=CONTRAST)
+        for rank, candidate in enumerate(candidates):
+            print("candidate {}: bbox={} score={:.3f} area={} ratio={:.2f} fill={:.2f} edge_density={:.2f}".format(
+                rank + 1, candidate["bbox"], candidate["score"], candidate["area"], candidate["ratio"],
+                candidate["fill"], candidate["edge_density"]))
+        bboxes = [candidate["bbox"] for candidate in candidates]
 
-
-    # Find label with largest size and compute a bounding box
-    largestComponentLabel = extractLargestLabel(connectedComponents_labels)
-    bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y = computeBoundaryBoxBounds(image_width, image_height, connectedComponents_array, largestComponentLabel)
-    
-    if not (boxHasExpectedRatio(bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y)):
-        for i in range(3):
-            tempLabel = extractLargestLabel(connectedComponents_labels)
-            min_x, max_x, min_y, max_y = computeBoundaryBoxBounds(image_width, image_height, connectedComponents_array, tempLabel)
-            if(boxHasExpectedRatio(min_x, max_x, min_y, max_y)):
-                largestComponentLabel = tempLabel
-                bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y = min_x, max_x, min_y, max_y
-                break
-            
+    bboxes = [bbox for bbox in bboxes if not visualization.isEmptyBoundingBox(bbox)]
+    if bboxes == []:
+        print("No licence plate found")
 
     px_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
 
-    # Draw a bounding box as a rectangle into the input image
-    axs1[1, 1].set_title('Final image of detection')
-    axs1[1, 1].imshow(px_array, cmap='gray')
-    rect = Rectangle((bbox_min_x, bbox_min_y), bbox_max_x - bbox_min_x, bbox_max_y - bbox_min_y, linewidth=1,
-                     edgecolor='g', facecolor='none')
-    axs1[1, 1].add_patch(rect)
-
-
-
-    # write the output image into output_filename, using the matplotlib savefig method
-    extent = axs1[1, 1].get_window_extent().transformed(fig1.dpi_scale_trans.inverted())
-    pyplot.savefig(output_filename, bbox_inches=extent, dpi=600)
-
-    if SHOW_DEBUG_FIGURES:
-        # plot the current figure
-        pyplot.show()
+    if PLAIN_OUTPUT and not SHOW_DEBUG_FIGURES:
+        polygons = [visualization.boundingBoxPolygon(bbox) for bbox in bboxes]
+        visualization.writeDetectionPNG(px_array, image_width, image_height, output_filename, polygons)
+    else:
+        # Draw the bounding boxes as rectangles into the input image and write it using the matplotlib savefig method
+        visualization.saveDetectionFigure(px_array_r, px_array_g, px_array_b, px_array, output_filename, SHOW_DEBUG_FIGURES,
+                                          bboxes=bboxes)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,66 @@
+# Automatic threshold selection for the contrast stretched standard deviation image.
+# The image only holds integers between 0 and 255, so one 256 bin histogram pass is enough to derive a
+# threshold with Otsu's method or from a percentile, without touching the pixels again.
+
+import histogram
+
+# Counts how often each of the values 0..255 occurs in the image_width x image_height pixels of pixel_array
+def computeHistogram256(pixel_array, image_width, image_height):
+    return histogram.computeHistogram(pixel_array, image_width, image_height)
+
+# Otsu's method: the threshold that maximises the between class variance of the two classes
+# value < threshold and value >= threshold
+def computeOtsuThreshold(histogram):
+    total = sum(histogram)
+    if total == 0:
+        return 0
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+
+    best_threshold = 0
+    best_variance = -1.0
+    background_count = 0
+    background_sum = 0
+    for threshold in range(1, len(histogram)):
+        background_count += histogram[threshold - 1]
+        background_sum += (threshold - 1) * histogram[threshold - 1]
+        foreground_count = total - background_count
+        if background_count == 0 or foreground_count == 0:
+            continue
+        background_mean = background_sum / background_count
+        foreground_mean = (weighted_total - background_sum) / foreground_count
+        variance = background_count * foreground_count * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = threshold
+    return best_threshold
+
+# The smallest threshold that puts at least percentile percent of the pixels below it,
+# i.e. roughly (100 - percentile) percent of the pixels end up in the foreground
+def computePercentileThreshold(histogram, percentile):
+    total = sum(histogram)
+    needed = total * percentile / 100
+    count = 0
+    for value in range(len(histogram)):
+        if count >= needed:
+            return value
+        count += histogram[value]
+    return len(histogram) - 1
+
+# Parses a threshold given on the command line: a number, "otsu" or "p<percentile>" like "p90"
+def parseThreshold(text):
+    if text == "otsu" or (text.startswith("p") and text[1:].replace(".", "", 1).isdigit()):
+        return text
+    return int(text)
+
+# Turns a threshold setting into a threshold value, fixed values are returned unchanged and
+# "otsu" / "p<percentile>" are derived from the histogram
+def resolveThreshold(thresholdValue, histogram):
+    if thresholdValue == "otsu":
+        return computeOtsuThreshold(histogram)
+    if isinstance(thresholdValue, str) and thresholdValue.startswith("p"):
+        return computePercentileThreshold(histogram, float(thresholdValue[1:]))
+    return thresholdValue
+
+# Returns true if the threshold setting needs the histogram of the image
+def isAdaptiveThreshold(thresholdValue):
+    return isinstance(thresholdValue, str)
@@ -0,0 +1,118 @@
+# Png members of zip and tar archives as batch input, read without extracting them.
+# A member is opened as a stream and handed to imageIO.png.Reader(file=...), so it never touches the disk.
+# Every thread of every worker process opens its own handle of an archive on first use and keeps it, the
+# handles of zipfile and tarfile can't be shared between processes and tarfile isn't thread safe either.
+# A tar member carries the offset and size of its data, so reading it never searches the member list. The members
+# of a compressed tar can only be reached by decompressing everything before them, the batch runner reads those
+# in archive order.
+
+import tarfile
+import threading
+import zipfile
+from collections import namedtuple
+
+# import our basic, light-weight png reader library
+import imageIO.png
+
+import detectors
+
+ZIP_SUFFIXES = (".zip",)
+COMPRESSED_TAR_SUFFIXES = (".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+TAR_SUFFIXES = (".tar",) + COMPRESSED_TAR_SUFFIXES
+
+# a png member of an archive as an image source of the batch runner. offset and size locate the data of a tar
+# member in the (uncompressed) tar stream, None for zip members and members only known by name.
+ArchiveMember = namedtuple("ArchiveMember", ["archive", "member", "offset", "size"], defaults=(None, None))
+
+# archive handles of the current thread, by archive path, and the tar members of those looked up by name
+OPEN_ARCHIVES = threading.local()
+
+# True if the file name has the suffix of a zip or tar archive
+def isArchive(filename):
+    return filename.lower().endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+# True for a member of a compressed tar, which is only read cheaply front to back: every seek backwards
+# decompresses the archive again from its start
+def isSequentialMember(source):
+    return isinstance(source, ArchiveMember) and source.archive.lower().endswith(COMPRESSED_TAR_SUFFIXES)
+
+# Opens a zip or tar archive for reading
+def openArchiveFile(archive):
+    if archive.lower().endswith(ZIP_SUFFIXES):
+        return zipfile.ZipFile(archive)
+    return tarfile.open(archive)
+
+# Returns this thread's handle of an archive, opened on first use
+def openArchive(archive):
+    handles = getattr(OPEN_ARCHIVES, "handles", None)
+    if handles is None:
+        handles = OPEN_ARCHIVES.handles = {}
+    if archive not in handles:
+        handles[archive] = openArchiveFile(archive)
+    return handles[archive]
+
+# Closes the archive handles of the current thread
+def closeArchives():
+    handles = getattr(OPEN_ARCHIVES, "handles", None)
+    if handles:
+        for handle in handles.values():
+            handle.close()
+        handles.clear()
+        OPEN_ARCHIVES.members = {}
+
+# The TarInfo of a tar member. Without its offset the member is looked up by name in a table built once per
+# handle, TarFile.getmember searches the whole member list on every call.
+def findTarMember(handle, source):
+    if source.offset is not None:
+        info = tarfile.TarInfo(source.member)
+        info.offset_data = source.offset
+        info.size = source.size
+        return info
+    members = getattr(OPEN_ARCHIVES, "members", None)
+    if members is None:
+        members = OPEN_ARCHIVES.members = {}
+    if source.archive not in members:
+        # the last of several members with the same name wins, as with getmember
+        members[source.archive] = {info.name: info for info in handle.getmembers()}
+    return members[source.archive][source.member]
+
+# Lists the png members of an archive in archive order, tar members with the offset and size of their data.
+# The archive is closed again, a handle inherited by forked worker processes would share its file position with them.
+def listArchiveMembers(archive):
+    with openArchiveFile(archive) as handle:
+        if isinstance(handle, zipfile.ZipFile):
+            members = [ArchiveMember(archive, info.filename) for info in handle.infolist() if not info.is_dir()]
+        else:
+            members = [ArchiveMember(archive, info.name, info.offset_data, info.size) for info in handle.getmembers() if info.isfile()]
+    return [member for member in members if member.member.lower().endswith(".png")]
+
+# Opens a member of an archive as a binary stream
+def openArchiveMember(source):
+    handle = openArchive(source.archive)
+    if isinstance(handle, zipfile.ZipFile):
+        return handle.open(source.member)
+    return handle.extractfile(findTarMember(handle, source))
+
+# Decodes a png member into width, height and r, g, b pixel arrays like detectors.readRGBImageFile
+def readRGBImageMember(source):
+    streams = []
+
+    def makeReader():
+        streams.append(openArchiveMember(source))
+        return imageIO.png.Reader(file=streams[-1])
+
+    try:
+        return detectors.readRGBImage(makeReader)
+    finally:
+        for stream in streams:
+            stream.close()
+
+# Replaces every archive among the input names by its png members
+def expandArchives(filenames):
+    sources = []
+    for filename in filenames:
+        if isArchive(filename):
+            sources.extend(listArchiveMembers(filename))
+        else:
+            sources.append(filename)
+    return sources
@@ -0,0 +1,88 @@
+# Checkpoint journal of a batch run, so a run that died can be restarted without repeating the finished images.
+# Every finished image appends one json line with its path, the hash of its png bytes, the variant, the parameters
+# and the detection. The journal is flushed after every line, and a line is fsynced at most checkpoint_seconds after
+# it was appended, by a timer if no later append comes first. So a crash loses at most that much work. On restart
+# the images whose content hash is journaled with the same variant and parameters are skipped, whatever their path
+# is now. A line cut off by the crash is ignored.
+
+import json
+import os
+import threading
+import time
+
+import resultCache
+
+DEFAULT_CHECKPOINT_SECONDS = 10.0
+
+class BatchJournal:
+    def __init__(self, path, checkpoint_seconds = DEFAULT_CHECKPOINT_SECONDS):
+        self.path = path
+        self.checkpoint_seconds = checkpoint_seconds
+        self.journal_file = None
+        self.last_sync = time.monotonic()
+        # pending fsync of the lines appended since the last one, and the lock it shares with the appends
+        self.sync_timer = None
+        self.lock = threading.Lock()
+        # a crash may have left a line without its newline, new lines must not be appended to it
+        self.needs_newline = False
+
+    # Reads the journal, returns the results of the finished images by their result cache key
+    # (content hash, variant and parameters, see resultCache.computeCacheKey)
+    def load(self):
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path) as journal_file:
+            for line in journal_file:
+                self.needs_newline = not line.endswith("\n")
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                completed[resultCache.computeCacheKey(entry["content_hash"], entry["variant"], entry["parameters"])] = entry["result"]
+        return completed
+
+    # Journals a finished result, it must carry the content_hash the batch runner adds when journaling
+    def append(self, result, variant, parameters):
+        entry = {"path": result["image"], "content_hash": result["content_hash"], "variant": variant,
+                 "parameters": parameters, "result": result}
+        with self.lock:
+            if self.journal_file is None:
+                self.journal_file = open(self.path, "a")
+                if self.needs_newline:
+                    self.journal_file.write("\n")
+                    self.needs_newline = False
+            self.journal_file.write(json.dumps(entry) + "\n")
+            self.journal_file.flush()
+            remaining = self.checkpoint_seconds - (time.monotonic() - self.last_sync)
+            if remaining <= 0:
+                self.sync()
+            elif self.sync_timer is None:
+                # a run that stalls after this line still gets it onto the disk in time
+                self.sync_timer = threading.Timer(remaining, self.timedSync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+
+    def timedSync(self):
+        with self.lock:
+            self.sync_timer = None
+            self.sync()
+
+    # fsyncs the journal, the caller holds the lock
+    def sync(self):
+        if self.sync_timer is not None:
+            self.sync_timer.cancel()
+            self.sync_timer = None
+        if self.journal_file is not None:
+            os.fsync(self.journal_file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.sync_timer is not None:
+                self.sync_timer.cancel()
+                self.sync_timer = None
+            if self.journal_file is not None:
+                self.sync()
+                self.journal_file.close()
+                self.journal_file = None
@@ -0,0 +1,211 @@
+import argparse
+import functools
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import detectors
+import projectionProfile
+import stageTimer
+
+# the images shipped with the repository, their reference outputs live in output_images
+BUNDLED_IMAGES = ["numberplate1.png", "numberplate2.png", "numberplate3.png", "numberplate4.png",
+                  "numberplate5.png", "numberplate6.png", "Test.png"]
+
+# synthetic sizes the bundled images can be upscaled to, "native" keeps the original size
+SYNTHETIC_SIZES = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# headless startup budget: importing both detectors may add at most this much on top of a bare interpreter
+STARTUP_TARGET_MS = 100.0
+
+STARTUP_IMPORT = ("import sys, CS373LicensePlateDetection, CS373Extension; "
+                  "sys.exit(1 if 'matplotlib' in sys.modules else 0)")
+
+# Nearest neighbour resampling of a pixel array to a new size
+def resizeNearest(pixel_array, image_width, image_height, new_width, new_height):
+    x_lookup = [x * image_width // new_width for x in range(new_width)]
+    resized = []
+    for y in range(new_height):
+        row = pixel_array[y * image_height // new_height]
+        resized.append([row[x] for x in x_lookup])
+    return resized
+
+# Times the detector repeats times on one image and returns a result entry with stage medians.
+# parameters are keyword arguments of the detector, the outcome of the profile check is counted for the report.
+def benchmarkImage(variant, px_array_r, px_array_g, px_array_b, image_width, image_height, repeats, parameters=None):
+    module = detectors.VARIANTS[variant]
+    parameters = parameters if parameters is not None else {}
+    totals = []
+    stage_runs = []
+    detection = None
+    profile_statistics = projectionProfile.newProfileStatistics()
+    checkedLabeling = projectionProfile.computeProfileCheckedLabeling
+    projectionProfile.computeProfileCheckedLabeling = functools.partial(checkedLabeling, statistics=profile_statistics)
+    try:
+        with stageTimer.StageTimer(module) as timer:
+            for i in range(repeats):
+                timer.reset()
+                start = time.perf_counter()
+                detection = module.detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height, **parameters)
+                totals.append(time.perf_counter() - start)
+                stage_runs.append(dict(timer.stage_times))
+    finally:
+        projectionProfile.computeProfileCheckedLabeling = checkedLabeling
+
+    stage_medians = {}
+    for name in stageTimer.STAGE_FUNCTIONS:
+        values = [run[name] for run in stage_runs if name in run]
+        if values:
+            stage_medians[name] = statistics.median(values)
+
+    total = statistics.median(totals)
+    return {"width": image_width, "height": image_height,
+            "total": total, "pixels_per_second": image_width * image_height / total,
+            "stages": stage_medians, "detection": detectors.detectionResult(variant, detection),
+            "profile": profile_statistics}
+
+# Prints a table with the per stage medians and throughput of one result entry
+def printResult(key, result):
+    pixels = result["width"] * result["height"]
+    print("{} ({}x{})".format(key, result["width"], result["height"]))
+    for name, seconds in result["stages"].items():
+        print("    {:<50} {:>10.1f} ms {:>10.3f} Mpx/s".format(name, seconds * 1000, pixels / seconds / 1e6))
+    print("    {:<50} {:>10.1f} ms {:>10.3f} Mpx/s".format("end to end", result["total"] * 1000,
+                                                           result["pixels_per_second"] / 1e6))
+    print("    detection: {}".format(result["detection"]))
+    profile = result.get("profile")
+    if profile and profile["frames"]:
+        print("    profile check: {} of {} frames skipped without a band, {:.1f}% of the pixels never started a component".format(
+            profile["skipped_frames"], profile["frames"], 100 * profile["skipped_pixels"] / profile["pixels"]))
+
+# Measures the median wall time of starting a fresh interpreter that runs code
+def measureInterpreterStartup(code, repeats):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", code])
+        times.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            return None
+    return statistics.median(times)
+
+# Checks the headless startup path: the detectors must import without matplotlib and within STARTUP_TARGET_MS
+def checkStartup(repeats, target_ms):
+    bare = measureInterpreterStartup("pass", repeats)
+    detectors = measureInterpreterStartup(STARTUP_IMPORT, repeats)
+    if detectors is None:
+        return ["startup: importing the detectors loaded matplotlib"]
+    overhead_ms = (detectors - bare) * 1000
+    print("startup: bare interpreter {:.1f} ms, with detectors {:.1f} ms, overhead {:.1f} ms (target {:.0f} ms)".format(
+        bare * 1000, detectors * 1000, overhead_ms, target_ms))
+    if overhead_ms > target_ms:
+        return ["startup: importing the detectors takes {:.1f} ms, target is {:.0f} ms".format(overhead_ms, target_ms)]
+    return []
+
+# Compares results against a baseline, returns a list of human readable failures
+def compareToBaseline(results, baseline, threshold, min_stage_seconds):
+    failures = []
+    for key, result in results.items():
+        if key not in baseline:
+            print("no baseline for {}, skipping comparison".format(key))
+            continue
+        expected = baseline[key]
+        if result["detection"] != expected["detection"]:
+            failures.append("{}: detection changed from {} to {}".format(key, expected["detection"], result["detection"]))
+        if result["total"] > expected["total"] * (1 + threshold):
+            failures.append("{}: end to end {:.1f} ms vs baseline {:.1f} ms".format(
+                key, result["total"] * 1000, expected["total"] * 1000))
+        for name, seconds in result["stages"].items():
+            expected_seconds = expected["stages"].get(name)
+            if expected_seconds is None or expected_seconds < min_stage_seconds:
+                continue
+            if seconds > expected_seconds * (1 + threshold):
+                failures.append("{}: stage {} {:.1f} ms vs baseline {:.1f} ms".format(
+                    key, name, seconds * 1000, expected_seconds * 1000))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the licence plate detectors on the bundled images")
+    parser.add_argument("images", nargs="*", default=BUNDLED_IMAGES, help="images to benchmark (default: bundled images)")
+    parser.add_argument("--variants", default="detection,extension", help="comma separated detectors to run")
+    parser.add_argument("--sizes", default="native",
+                        help="comma separated sizes, any of native," + ",".join(SYNTHETIC_SIZES))
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a detector parameter, e.g. minBandPixels=0 to switch the profile check off")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per image, the median is reported")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative slowdown before a run counts as a regression")
+    parser.add_argument("--min-stage-ms", type=float, default=20.0,
+                        help="stages faster than this in the baseline are not gated")
+    parser.add_argument("--startup", action="store_true", help="only check the headless startup time")
+    parser.add_argument("--startup-target-ms", type=float, default=STARTUP_TARGET_MS,
+                        help="allowed import overhead of the detectors on top of a bare interpreter")
+    args = parser.parse_args()
+
+    if args.startup:
+        failures = checkStartup(max(args.repeats, 5), args.startup_target_ms)
+        for failure in failures:
+            print("    " + failure)
+        sys.exit(1 if failures else 0)
+
+    variants = args.variants.split(",")
+    sizes = args.sizes.split(",")
+    parameters = {}
+    for variant in variants:
+        if variant not in detectors.VARIANTS:
+            parser.error("unknown variant {}".format(variant))
+        try:
+            parameters[variant] = detectors.parseParameters(variant, args.set)
+        except ValueError as error:
+            parser.error(str(error))
+    for size in sizes:
+        if size != "native" and size not in SYNTHETIC_SIZES:
+            parser.error("unknown size {}".format(size))
+
+    results = {}
+    for image in args.images:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(image)
+        for size in sizes:
+            if size == "native":
+                arrays = (px_array_r, px_array_g, px_array_b, image_width, image_height)
+            else:
+                new_width, new_height = SYNTHETIC_SIZES[size]
+                arrays = tuple(resizeNearest(channel, image_width, image_height, new_width, new_height)
+                               for channel in (px_array_r, px_array_g, px_array_b)) + (new_width, new_height)
+            for variant in variants:
+                key = "{}/{}@{}".format(variant, Path(image).name, size)
+                results[key] = benchmarkImage(variant, *arrays, args.repeats, parameters[variant])
+                printResult(key, results[key])
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline = {}
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text())
+        baseline.update(results)
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print("baseline written to {}".format(baseline_path))
+        return
+
+    if not baseline_path.exists():
+        print("no baseline at {}, run with --save-baseline to create one".format(baseline_path))
+        return
+
+    failures = compareToBaseline(results, json.loads(baseline_path.read_text()), args.threshold,
+                                 args.min_stage_ms / 1000)
+    if failures:
+        print("REGRESSIONS:")
+        for failure in failures:
+            print("    " + failure)
+        sys.exit(1)
+    print("no regressions against {}".format(baseline_path))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Thin client of detectorDaemon.py with the command line of CS373LicensePlateDetection.py:
+#   python detectorClient.py [input.png [output.png]] [--plain-output] [--candidates K] [--pyramid LEVELS]
+#                            [--threshold VALUE] [--contrast METHOD]
+# plus --variant, --socket and --send-bytes to send the png bytes instead of the path. It only imports the
+# standard library, the detection, the output image and matplotlib are all handled by the warm daemon.
+# The result is printed as one json line.
+
+import json
+import os
+import socket
+import sys
+import tempfile
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "cs373-detector-{}.sock".format(os.getuid()))
+
+# Removes an option with a value from the argument list and returns the value, default if it isn't given
+def popOption(command_line_arguments, name, default=None):
+    if name not in command_line_arguments:
+        return default
+    index = command_line_arguments.index(name)
+    value = command_line_arguments[index + 1]
+    del command_line_arguments[index:index + 2]
+    return value
+
+# Removes a flag from the argument list and returns whether it was given
+def popFlag(command_line_arguments, name):
+    present = name in command_line_arguments
+    while name in command_line_arguments:
+        command_line_arguments.remove(name)
+    return present
+
+# Sends one request to the daemon and returns its json response, png_bytes follow the request line if given
+def sendRequest(socket_path, request, png_bytes=None):
+    if png_bytes is not None:
+        request = dict(request, size=len(png_bytes))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode() + b"\n" + (png_bytes or b""))
+        with connection.makefile("rb") as response:
+            return json.loads(response.readline())
+
+def main():
+    command_line_arguments = sys.argv[1:]
+
+    socket_path = popOption(command_line_arguments, "--socket", DEFAULT_SOCKET)
+    variant = popOption(command_line_arguments, "--variant", "detection")
+    send_bytes = popFlag(command_line_arguments, "--send-bytes")
+    plain_output = popFlag(command_line_arguments, "--plain-output")
+    candidates = popOption(command_line_arguments, "--candidates")
+    pyramid = popOption(command_line_arguments, "--pyramid")
+    parameters = {}
+    threshold = popOption(command_line_arguments, "--threshold")
+    if threshold is not None:
+        parameters["thresholdValue"] = threshold
+    contrast = popOption(command_line_arguments, "--contrast")
+    if contrast is not None:
+        parameters["contrast"] = contrast
+
+    input_filename = command_line_arguments[0] if command_line_arguments else "numberplate1.png"
+    if len(command_line_arguments) == 2:
+        output_filename = command_line_arguments[1]
+    else:
+        os.makedirs("output_images", exist_ok=True)
+        output_filename = os.path.join("output_images", input_filename.replace(".png", "_output.png"))
+
+    # the daemon runs in its own working directory, so paths are sent absolute
+    request = {"variant": variant, "parameters": parameters, "output": os.path.abspath(output_filename), "plain": plain_output}
+    if candidates is not None:
+        request["candidates"] = int(candidates)
+    if pyramid is not None:
+        request["pyramid"] = int(pyramid)
+    png_bytes = None
+    if send_bytes:
+        with open(input_filename, "rb") as input_file:
+            png_bytes = input_file.read()
+    else:
+        request["path"] = os.path.abspath(input_filename)
+
+    try:
+        response = sendRequest(socket_path, request, png_bytes)
+    except (ConnectionRefusedError, FileNotFoundError):
+        sys.exit("no detector daemon on {}, start it with python detectorDaemon.py".format(socket_path))
+    print(json.dumps(response))
+    if "error" in response:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
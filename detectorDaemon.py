@@ -0,0 +1,145 @@
+# Warm detector daemon.
+# Every run of CS373LicensePlateDetection.py pays for the interpreter startup and the module imports before it
+# touches a pixel. The daemon loads the detectors once, listens on a Unix domain socket and runs the requests on a
+# pool of worker processes that stay loaded too. detectorClient.py is the thin client with the arguments of
+# CS373LicensePlateDetection.py.
+#
+# Protocol: a connection sends any number of requests and gets one json line back for each, in order.
+# A request is a json line with either "path" (a png file the daemon can read) or "size", the number of raw png
+# bytes that follow the line. Optional entries: "variant", "parameters" (NAME: VALUE strings as for --set),
+# "candidates" (top k), "pyramid" (levels), "output" (png file to write the detection into) and "plain"
+# (write it without matplotlib). {"command": "ping"} and {"command": "shutdown"} control the daemon.
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import detectors
+import visualization
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "cs373-detector-{}.sock".format(os.getuid()))
+
+# Runs one request in a worker process and returns its json result
+def handleRequest(request, png_bytes=None):
+    start = time.perf_counter()
+    variant = request.get("variant", "detection")
+    if variant not in detectors.VARIANTS:
+        raise ValueError("unknown variant {}".format(variant))
+    parameters = detectors.parseParameters(variant, ["{}={}".format(name, value) for name, value in request.get("parameters", {}).items()])
+    if png_bytes is not None:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageBytes(png_bytes)
+    else:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(request["path"])
+
+    detection = detectors.VARIANTS["detection"]
+    if request.get("candidates") is not None:
+        if variant != "detection":
+            raise ValueError("candidates are only ranked by the detection variant")
+        candidates = detection.detectLicensePlateCandidates(px_array_r, px_array_g, px_array_b, image_width, image_height,
+                                                            int(request["candidates"]), parameters["thresholdValue"], parameters["closingIterations"],
+                                                            parameters["contrast"])
+        result = {"candidates": [{name: list(value) if name == "bbox" else value for name, value in candidate.items()} for candidate in candidates]}
+        polygons = [visualization.boundingBoxPolygon(candidate["bbox"]) for candidate in candidates]
+    else:
+        if request.get("pyramid") is not None:
+            if variant != "detection":
+                raise ValueError("the pyramid is only available for the detection variant")
+            import pyramid
+            result = {"bbox": list(pyramid.detectLicensePlatePyramid(px_array_r, px_array_g, px_array_b, image_width, image_height, int(request["pyramid"]),
+                                                                     thresholdValue=parameters["thresholdValue"], contrast=parameters["contrast"]))}
+        else:
+            result = detectors.runDetection(variant, px_array_r, px_array_g, px_array_b, image_width, image_height, parameters)
+        if visualization.isEmptyBoundingBox(result["bbox"]):
+            polygons = []
+        else:
+            polygons = [result["points"]] if result.get("points") else [visualization.boundingBoxPolygon(result["bbox"])]
+
+    if request.get("output"):
+        px_array = detection.computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+        if request.get("plain"):
+            visualization.writeDetectionPNG(px_array, image_width, image_height, request["output"], polygons)
+        else:
+            visualization.saveDetectionFigure(px_array_r, px_array_g, px_array_b, px_array, request["output"], False, polygons=polygons)
+        result["output"] = request["output"]
+    result["milliseconds"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+# Reads the requests of one connection and answers them with the results of the worker pool
+class DetectorRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                command = request.get("command")
+                if command == "ping":
+                    response = {"status": "ok", "pid": os.getpid()}
+                elif command == "shutdown":
+                    response = {"status": "shutting down"}
+                    threading.Thread(target=self.server.shutdown).start()
+                elif command is not None:
+                    raise ValueError("unknown command {}".format(command))
+                else:
+                    png_bytes = self.rfile.read(int(request["size"])) if "size" in request else None
+                    response = self.server.pool.submit(handleRequest, request, png_bytes).result()
+            except Exception as error:
+                response = {"error": "{}: {}".format(type(error).__name__, error)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+class DetectorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, workers):
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        super().__init__(socket_path, DetectorRequestHandler)
+
+# True if a daemon accepts connections on the socket path, False for a missing path or a socket file left behind
+# by a daemon that didn't shut down cleanly
+def isDaemonListening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve plate detections on a Unix domain socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="socket path (default %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    args = parser.parse_args()
+
+    if os.path.exists(args.socket):
+        if isDaemonListening(args.socket):
+            sys.exit("a detector daemon is already listening on {}".format(args.socket))
+        # a socket file left behind by a daemon that didn't shut down cleanly
+        os.remove(args.socket)
+    server = DetectorServer(args.socket, args.workers)
+    # the socket file is only removed on shutdown while it is still the one this daemon created
+    socket_inode = os.stat(args.socket).st_ino
+    # start the workers now so the first request doesn't wait for them
+    for future in [server.pool.submit(os.getpid) for i in range(args.workers)]:
+        future.result()
+    print("listening on {} with {} workers".format(args.socket, args.workers), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown()
+        try:
+            if os.stat(args.socket).st_ino == socket_inode:
+                os.remove(args.socket)
+        except FileNotFoundError:
+            pass
+
+if __name__ == "__main__":
+    main()
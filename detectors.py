@@ -0,0 +1,123 @@
+# Common entry point for tools that run either detector variant on a png file or png bytes and need
+# the result as plain json data (benchmarks, caches, batch runners).
+
+import io
+
+import CS373LicensePlateDetection
+import CS373Extension
+
+# import our basic, light-weight png reader library
+import imageIO.png
+
+# adaptive thresholds are given as strings, e.g. "otsu" or "p90"
+import adaptiveThreshold
+
+VARIANTS = {"detection": CS373LicensePlateDetection, "extension": CS373Extension}
+
+# parameters of the stages up to the standard deviation image, the detectors take them in detectLicensePlate only
+PREPROCESSING_PARAMETERS = ["contrast"]
+
+# Returns a copy of the default parameters of a detector variant
+def defaultParameters(variant):
+    return dict(VARIANTS[variant].DEFAULT_PARAMETERS)
+
+# Parses NAME=VALUE settings from the command line into a parameters dict for the variant,
+# values are converted to the type of the default value
+def parseParameters(variant, settings):
+    parameters = defaultParameters(variant)
+    for setting in settings:
+        name, value = setting.split("=", 1)
+        if name not in parameters:
+            raise ValueError("unknown parameter {} for {}, expected one of {}".format(name, variant, ", ".join(parameters)))
+        if name == "thresholdValue":
+            parameters[name] = adaptiveThreshold.parseThreshold(value)
+        else:
+            parameters[name] = type(parameters[name])(value)
+    return parameters
+
+# Splits png rows with interleaved channels into r, g, b pixel arrays, greyscale rows are copied into all three
+def splitChannels(rows, planes):
+    pixel_array_r = []
+    pixel_array_g = []
+    pixel_array_b = []
+    for row in rows:
+        if planes < 3:
+            channel = list(row[0::planes])
+            pixel_array_r.append(channel)
+            pixel_array_g.append(list(channel))
+            pixel_array_b.append(list(channel))
+        else:
+            pixel_array_r.append(list(row[0::planes]))
+            pixel_array_g.append(list(row[1::planes]))
+            pixel_array_b.append(list(row[2::planes]))
+    return pixel_array_r, pixel_array_g, pixel_array_b
+
+# Decodes a png reader into width, height and r, g, b pixel arrays like readRGBImageToSeparatePixelArrays,
+# palette and 16 bit images are converted to 8 bit RGB first. make_reader returns a fresh imageIO.png.Reader.
+def readRGBImage(make_reader):
+    (image_width, image_height, rows, info) = make_reader().read()
+    if "palette" in info or info["bitdepth"] != 8:
+        (image_width, image_height, rows, info) = make_reader().asRGBA8()
+    px_array_r, px_array_g, px_array_b = splitChannels(rows, info["planes"])
+    return (image_width, image_height, px_array_r, px_array_g, px_array_b)
+
+# Decodes png bytes into width, height and r, g, b pixel arrays
+def readRGBImageBytes(png_bytes):
+    return readRGBImage(lambda: imageIO.png.Reader(bytes=png_bytes))
+
+# Decodes a png file into width, height and r, g, b pixel arrays
+def readRGBImageFile(filename):
+    return readRGBImage(lambda: imageIO.png.Reader(filename=filename))
+
+# Splits a stream of concatenated png files, e.g. the output of ffmpeg -f image2pipe -vcodec png -, and yields the
+# bytes of one png after the other. Every png is walked chunk by chunk up to its IEND chunk with imageIO.png.Reader,
+# which verifies the checksums, so only one png is held at a time and nothing is read ahead of it.
+def iteratePNGStream(stream):
+    while True:
+        header = stream.read(len(imageIO.png.signature))
+        if not header:
+            return
+        if header != imageIO.png.signature:
+            raise imageIO.png.FormatError("the stream does not continue with a png signature")
+        reader = imageIO.png.Reader(file=stream)
+        # the signature was read above to detect the end of the stream
+        reader.signature = header
+        png_bytes = io.BytesIO()
+        png_bytes.write(header)
+        for chunk_type, data in reader.chunks():
+            imageIO.png.write_chunk(png_bytes, chunk_type, data)
+        yield png_bytes.getvalue()
+
+# Turns the return value of a detector into json data: every result has the bounding box
+# [min_x, max_x, min_y, max_y], the extension adds its four boundary points and the rotation.
+# A frame without a plate gets a box with min > max.
+def detectionResult(variant, detection):
+    if variant == "extension":
+        boundaryPoints, rotation = detection
+        if boundaryPoints is None:
+            return {"bbox": [0, -1, 0, -1], "points": [], "rotation": None}
+        xs = [point[0] for point in boundaryPoints]
+        ys = [point[1] for point in boundaryPoints]
+        return {"bbox": [min(xs), max(xs), min(ys), max(ys)],
+                "points": [list(point) for point in boundaryPoints],
+                "rotation": None if rotation is None else round(rotation, 1)}
+    return {"bbox": list(detection)}
+
+# Runs a detector variant on r, g, b pixel arrays and returns the result as json data
+def runDetection(variant, px_array_r, px_array_g, px_array_b, image_width, image_height, parameters=None):
+    parameters = parameters if parameters is not None else {}
+    detection = VARIANTS[variant].detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height, **parameters)
+    return detectionResult(variant, detection)
+
+# Computes the stretched standard deviation image, the most expensive stage, it only depends on the contrast parameter
+def computeStandardDeviationImage(px_array_r, px_array_g, px_array_b, image_width, image_height, contrast="stretch"):
+    px_array = CS373LicensePlateDetection.computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+    return CS373LicensePlateDetection.computeStretchedStandardDeviationImage(px_array, image_width, image_height, contrast)
+
+# Runs the stages after the standard deviation of a detector variant and returns the result as json data,
+# the standard deviation image is overwritten. Preprocessing parameters are ignored, they are already part of the image.
+def runDetectionFromStandardDeviationImage(variant, std_dev_array, image_width, image_height, parameters=None):
+    parameters = parameters if parameters is not None else {}
+    parameters = {name: value for name, value in parameters.items() if name not in PREPROCESSING_PARAMETERS}
+    detection = VARIANTS[variant].detectLicensePlateFromStandardDeviationImage(std_dev_array, image_width, image_height, **parameters)
+    return detectionResult(variant, detection)
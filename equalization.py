@@ -0,0 +1,167 @@
+# Contrast enhancement of greyscale images before the standard deviation stage.
+# The detectors stretch the darkest to the brightest pixel over 0..255, which does little for a dark night frame with
+# one bright headlight in it. Global histogram equalization spreads the occupied grey values over the full range,
+# CLAHE (contrast limited adaptive histogram equalization) does the same per tile, limits how steep each tile
+# mapping may get and blends the mappings of the 4 nearest tiles bilinearly. Both cost a fixed number of operations
+# per pixel and a fixed number per histogram bin.
+
+import argparse
+import statistics
+import time
+
+import histogram
+
+# the contrast enhancements a detector accepts for its "contrast" parameter, "stretch" is the original min/max stretch
+CONTRAST_METHODS = ["stretch", "equalize", "clahe"]
+
+# CLAHE splits the image into CLAHE_TILES x CLAHE_TILES tiles, a bin of a tile histogram may hold at most
+# CLAHE_CLIP_LIMIT times the average bin count, the rest is spread over all bins
+CLAHE_TILES = 8
+CLAHE_CLIP_LIMIT = 2.0
+
+# Maps every pixel through a 256 entry lookup table
+def applyLUT(pixel_array, lut):
+    return [list(map(lut.__getitem__, row)) for row in pixel_array]
+
+# Lookup table that equalizes a 256 bin histogram: the cumulative histogram scaled to 0..255,
+# the darkest occupied value is mapped to 0
+def computeEqualizationLUT(value_counts):
+    cumulative = histogram.computeCumulativeHistogram(value_counts)
+    total = cumulative[-1]
+    lowest = next((count for count in cumulative if count > 0), 0)
+    if total == lowest:
+        return list(range(256))
+    return [max(0, round((count - lowest) * 255 / (total - lowest))) for count in cumulative]
+
+# Global histogram equalization of a greyscale image
+def computeHistogramEqualization(pixel_array, image_width, image_height):
+    value_counts = histogram.computeValueCounts(pixel_array[:image_height])
+    return applyLUT(pixel_array, computeEqualizationLUT(value_counts))
+
+# Cuts every bin of a tile histogram at limit and spreads the cut off counts evenly over all bins
+def clipHistogram(value_counts, limit):
+    excess = 0
+    clipped = []
+    for count in value_counts:
+        if count > limit:
+            excess += count - limit
+            count = limit
+        clipped.append(count)
+    share, remainder = divmod(excess, 256)
+    return [count + share + (1 if value < remainder else 0) for value, count in enumerate(clipped)]
+
+# Tile boundaries along one axis and, for every coordinate, the two tiles whose centres enclose it
+# and the weight of the second one
+def computeTileInterpolation(size, tiles):
+    edges = [i * size // tiles for i in range(tiles + 1)]
+    centres = [(edges[i] + edges[i + 1] - 1) / 2 for i in range(tiles)]
+    interpolation = []
+    tile = 0
+    for position in range(size):
+        while tile < tiles - 2 and position >= centres[tile + 1]:
+            tile += 1
+        if tiles == 1 or position <= centres[0]:
+            interpolation.append((0, 0, 0.0))
+        elif position >= centres[-1]:
+            interpolation.append((tiles - 1, tiles - 1, 0.0))
+        else:
+            interpolation.append((tile, tile + 1, (position - centres[tile]) / (centres[tile + 1] - centres[tile])))
+    return edges, interpolation
+
+# Contrast limited adaptive histogram equalization of a greyscale image
+def computeCLAHE(pixel_array, image_width, image_height, tiles=CLAHE_TILES, clipLimit=CLAHE_CLIP_LIMIT):
+    tiles_x = max(1, min(tiles, image_width))
+    tiles_y = max(1, min(tiles, image_height))
+    x_edges, x_interpolation = computeTileInterpolation(image_width, tiles_x)
+    y_edges, y_interpolation = computeTileInterpolation(image_height, tiles_y)
+
+    # one clipped, equalized lookup table per tile
+    luts = []
+    for j in range(tiles_y):
+        lut_row = []
+        tile_counts = [[0] * 256 for i in range(tiles_x)]
+        for y in range(y_edges[j], y_edges[j + 1]):
+            row = pixel_array[y]
+            for i in range(tiles_x):
+                counts = tile_counts[i]
+                for value in row[x_edges[i]:x_edges[i + 1]]:
+                    counts[value] += 1
+        for i in range(tiles_x):
+            tile_pixels = (x_edges[i + 1] - x_edges[i]) * (y_edges[j + 1] - y_edges[j])
+            limit = max(1, int(clipLimit * tile_pixels / 256))
+            cumulative = histogram.computeCumulativeHistogram(clipHistogram(tile_counts[i], limit))
+            lut_row.append([round(count * 255 / tile_pixels) if tile_pixels else value for value, count in enumerate(cumulative)])
+        luts.append(lut_row)
+
+    # blend the mappings of the 4 tiles around every pixel
+    result = []
+    for y in range(image_height):
+        top, bottom, fy = y_interpolation[y]
+        top_luts = luts[top]
+        bottom_luts = luts[bottom]
+        row = pixel_array[y]
+        new_row = []
+        for x in range(image_width):
+            left, right, fx = x_interpolation[x]
+            value = row[x]
+            upper = top_luts[left][value] + (top_luts[right][value] - top_luts[left][value]) * fx
+            lower = bottom_luts[left][value] + (bottom_luts[right][value] - bottom_luts[left][value]) * fx
+            new_row.append(int(upper + (lower - upper) * fy + 0.5))
+        result.append(new_row)
+    return result
+
+# Applies the "equalize" or "clahe" contrast enhancement to a greyscale image
+def computeContrastEnhancement(pixel_array, image_width, image_height, method):
+    if method == "equalize":
+        return computeHistogramEqualization(pixel_array, image_width, image_height)
+    if method == "clahe":
+        return computeCLAHE(pixel_array, image_width, image_height)
+    raise ValueError("unknown contrast enhancement {}, expected one of {}".format(method, ", ".join(CONTRAST_METHODS)))
+
+# Simulates a night frame: the image is darkened to a few grey values and a saturated headlight is added
+def simulateNightFrame(pixel_array, image_width, image_height, brightness=0.12):
+    night = [[int(value * brightness) for value in row] for row in pixel_array]
+    size = max(2, min(image_width, image_height) // 20)
+    for y in range(size):
+        for x in range(size):
+            night[y][x] = 255
+    return night
+
+# Times the contrast enhancements against the min/max stretch and reports the plate each of them leads to
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the contrast enhancements against the min/max stretch")
+    parser.add_argument("images", nargs="*", default=["numberplate1.png", "numberplate5.png", "Test.png"])
+    parser.add_argument("--variant", default="detection")
+    parser.add_argument("--night", action="store_true", help="darken the frames and add a headlight first")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    # the detectors import this module, so they are only imported here
+    import detectors
+    import CS373LicensePlateDetection as detection
+
+    print("{:<18} {:<9} {:>10} {:>12}  {}".format("image", "contrast", "enhance", "detection", "plate"))
+    for image in args.images:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(image)
+        px_array = detection.computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+        if args.night:
+            px_array = simulateNightFrame(px_array, image_width, image_height)
+        for method in CONTRAST_METHODS:
+            times = []
+            for i in range(args.repeats):
+                start = time.perf_counter()
+                if method == "stretch":
+                    enhanced = detection.scaleTo0And255AndQuantize(px_array, image_width, image_height)
+                else:
+                    enhanced = computeContrastEnhancement(px_array, image_width, image_height, method)
+                times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            std_dev_array = detection.computeStandardDeviationImage5x5(enhanced, image_width, image_height)
+            std_dev_array = detection.scaleTo0And255AndQuantize(std_dev_array, image_width, image_height)
+            result = detectors.runDetectionFromStandardDeviationImage(args.variant, std_dev_array, image_width, image_height)
+            detect_seconds = time.perf_counter() - start
+            print("{:<18} {:<9} {:>7.1f} ms {:>9.0f} ms  {}".format(
+                image, method, statistics.median(times) * 1000, detect_seconds * 1000, result["bbox"]))
+
+if __name__ == "__main__":
+    main()
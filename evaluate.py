@@ -0,0 +1,118 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import detectors
+import geometry
+
+DEFAULT_GROUND_TRUTH = "ground_truth.json"
+
+# a detection counts as correct when it overlaps a ground truth plate by at least this much
+DEFAULT_IOU_THRESHOLD = 0.5
+
+# Reads a ground truth file, returns a list of (image path, list of plate polygons).
+# Image paths are relative to the ground truth file, every plate is either a "box" or a "polygon".
+def readGroundTruth(filename):
+    data = json.loads(Path(filename).read_text())
+    base = Path(filename).parent
+    entries = []
+    for image, entry in data["images"].items():
+        plates = []
+        for plate in entry["plates"]:
+            if "polygon" in plate:
+                plates.append([tuple(point) for point in plate["polygon"]])
+            else:
+                plates.append(geometry.boxToPolygon(plate["box"]))
+        entries.append((str(base / image), plates))
+    return entries
+
+# The outline of a detection result, None if the detector found no component at all
+def detectionPolygon(result):
+    min_x, max_x, min_y, max_y = result["bbox"]
+    if min_x > max_x or min_y > max_y:
+        return None
+    if "points" in result:
+        return [tuple(point) for point in result["points"]]
+    return geometry.boxToPolygon(result["bbox"])
+
+# Runs a detector on one image, returns the detection, the best IoU with a ground truth plate and the timings
+def evaluateImage(variant, parameters, image, plates, repeats):
+    start = time.perf_counter()
+    (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(image)
+    decode_seconds = time.perf_counter() - start
+
+    detect_times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = detectors.runDetection(variant, px_array_r, px_array_g, px_array_b, image_width, image_height, parameters)
+        detect_times.append(time.perf_counter() - start)
+
+    polygon = detectionPolygon(result)
+    iou = max([geometry.computePolygonIoU(polygon, plate) for plate in plates], default=0.0) if polygon else 0.0
+    detect_seconds = statistics.median(detect_times)
+    return {"variant": variant, "image": image, "width": image_width, "height": image_height, "detection": result,
+            "detected": polygon is not None, "iou": iou, "decode_ms": decode_seconds * 1000,
+            "detect_ms": detect_seconds * 1000, "pixels_per_second": image_width * image_height / detect_seconds}
+
+# Precision, recall, mean IoU and latency of the rows of one variant. Each image yields at most one detection,
+# which is a true positive if its IoU reaches iou_threshold.
+def summariseVariant(rows, plate_count, iou_threshold):
+    detections = sum(1 for row in rows if row["detected"])
+    true_positives = sum(1 for row in rows if row["detected"] and row["iou"] >= iou_threshold)
+    return {"images": len(rows), "plates": plate_count, "detections": detections, "true_positives": true_positives,
+            "precision": true_positives / detections if detections else 0.0,
+            "recall": true_positives / plate_count if plate_count else 0.0,
+            "mean_iou": statistics.mean(row["iou"] for row in rows) if rows else 0.0,
+            "median_detect_ms": statistics.median(row["detect_ms"] for row in rows) if rows else 0.0,
+            "mean_megapixels_per_second": statistics.mean(row["pixels_per_second"] for row in rows) / 1e6 if rows else 0.0}
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the detectors against ground truth plate outlines")
+    parser.add_argument("--ground-truth", default=DEFAULT_GROUND_TRUTH, help="json file with the plate outlines")
+    parser.add_argument("--variants", default="detection,extension", help="comma separated detectors to run")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a parameter of every variant that has it, e.g. thresholdValue=otsu")
+    parser.add_argument("--iou-threshold", type=float, default=DEFAULT_IOU_THRESHOLD)
+    parser.add_argument("--repeats", type=int, default=1, help="detection runs per image, the median time is used")
+    parser.add_argument("--json", help="also write the per image rows and the summary to this file")
+    args = parser.parse_args()
+
+    entries = readGroundTruth(args.ground_truth)
+    plate_count = sum(len(plates) for image, plates in entries)
+    report = {"rows": [], "summary": {}}
+    for variant in args.variants.split(","):
+        if variant not in detectors.VARIANTS:
+            parser.error("unknown variant {}".format(variant))
+        defaults = detectors.defaultParameters(variant)
+        settings = [setting for setting in args.set if setting.split("=", 1)[0] in defaults]
+        try:
+            parameters = detectors.parseParameters(variant, settings)
+        except ValueError as error:
+            parser.error(str(error))
+
+        rows = []
+        for image, plates in entries:
+            row = evaluateImage(variant, parameters, image, plates, args.repeats)
+            rows.append(row)
+            print("{:<10} {:<20} iou {:.3f} {:>9.0f} ms detect {:>7.0f} ms decode  {}".format(
+                variant, Path(image).name, row["iou"], row["detect_ms"], row["decode_ms"], row["detection"]["bbox"]))
+            sys.stdout.flush()
+        report["rows"].extend(rows)
+        report["summary"][variant] = summariseVariant(rows, plate_count, args.iou_threshold)
+        report["summary"][variant]["parameters"] = parameters
+
+    print()
+    print("{:<10} {:>9} {:>9} {:>9} {:>12} {:>10}".format("variant", "precision", "recall", "mean iou", "median ms", "Mpx/s"))
+    for variant, summary in report["summary"].items():
+        print("{:<10} {:>9.3f} {:>9.3f} {:>9.3f} {:>12.0f} {:>10.3f}".format(
+            variant, summary["precision"], summary["recall"], summary["mean_iou"], summary["median_detect_ms"],
+            summary["mean_megapixels_per_second"]))
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+
+if __name__ == "__main__":
+    main()
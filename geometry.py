@@ -0,0 +1,138 @@
+# Small 2D geometry helpers for plate outlines, points are (x, y) pairs in pixel coordinates.
+
+# Signed area of a polygon (shoelace formula), positive for counterclockwise points in a y-up frame
+def computeSignedArea(polygon):
+    area = 0.0
+    for i in range(len(polygon)):
+        x1, y1 = polygon[i]
+        x2, y2 = polygon[(i + 1) % len(polygon)]
+        area += x1 * y2 - x2 * y1
+    return area / 2
+
+def computePolygonArea(polygon):
+    return abs(computeSignedArea(polygon))
+
+# Returns the polygon with its points in counterclockwise order
+def orientCounterclockwise(polygon):
+    polygon = [tuple(point) for point in polygon]
+    if computeSignedArea(polygon) < 0:
+        polygon.reverse()
+    return polygon
+
+# The 4 corners of a bounding box given as min_x, max_x, min_y, max_y
+def boxToPolygon(bbox):
+    min_x, max_x, min_y, max_y = bbox
+    return [(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)]
+
+# Clips a polygon against a convex polygon (Sutherland-Hodgman), both counterclockwise
+def clipPolygon(subject, clip):
+    output = list(subject)
+    for i in range(len(clip)):
+        if output == []:
+            break
+        edge_start = clip[i]
+        edge_end = clip[(i + 1) % len(clip)]
+
+        def inside(point):
+            return ((edge_end[0] - edge_start[0]) * (point[1] - edge_start[1])
+                    - (edge_end[1] - edge_start[1]) * (point[0] - edge_start[0])) >= 0
+
+        def intersection(a, b):
+            dx1, dy1 = b[0] - a[0], b[1] - a[1]
+            dx2, dy2 = edge_end[0] - edge_start[0], edge_end[1] - edge_start[1]
+            denominator = dx1 * dy2 - dy1 * dx2
+            if denominator == 0:
+                return a
+            t = ((edge_start[0] - a[0]) * dy2 - (edge_start[1] - a[1]) * dx2) / denominator
+            return (a[0] + t * dx1, a[1] + t * dy1)
+
+        points = output
+        output = []
+        for j in range(len(points)):
+            current = points[j]
+            previous = points[j - 1]
+            if inside(current):
+                if not inside(previous):
+                    output.append(intersection(previous, current))
+                output.append(current)
+            elif inside(previous):
+                output.append(intersection(previous, current))
+    return output
+
+# Intersection over union of two convex polygons
+def computePolygonIoU(a, b):
+    a = orientCounterclockwise(a)
+    b = orientCounterclockwise(b)
+    area_a = computePolygonArea(a)
+    area_b = computePolygonArea(b)
+    if area_a == 0 or area_b == 0:
+        return 0.0
+    intersection = clipPolygon(a, b)
+    intersection_area = computePolygonArea(intersection) if len(intersection) >= 3 else 0.0
+    return intersection_area / (area_a + area_b - intersection_area)
+
+# z component of the cross product of o->a and o->b, positive if o, a, b turn counterclockwise
+def computeCross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+# Convex hull of a set of points (monotone chain), counterclockwise without collinear points
+def computeConvexHull(points):
+    points = sorted(set(tuple(point) for point in points))
+    if len(points) <= 2:
+        return points
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and computeCross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and computeCross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return lower[:-1] + upper[:-1]
+
+def computeDot(a, b):
+    return a[0] * b[0] + a[1] * b[1]
+
+# Minimum area rectangle enclosing a convex hull (rotating calipers): one side of the optimal rectangle lies on a
+# hull edge, so every edge is tried while the three calipers touching the far sides only ever advance around the hull.
+# Returns the 4 corners in hull order, the first side lies on the chosen edge. Degenerate hulls give their bounding box.
+def computeMinimumAreaRectangle(hull):
+    if len(hull) < 3:
+        xs = [point[0] for point in hull]
+        ys = [point[1] for point in hull]
+        return boxToPolygon((min(xs), max(xs), min(ys), max(ys)))
+
+    n = len(hull)
+    best_area = None
+    best_corners = None
+    # the caliper furthest along the current edge, the one furthest away from it and the one furthest back along it
+    right = 1
+    for i in range(n):
+        edge_start = hull[i]
+        edge_end = hull[(i + 1) % n]
+        length = ((edge_end[0] - edge_start[0]) ** 2 + (edge_end[1] - edge_start[1]) ** 2) ** 0.5
+        u = ((edge_end[0] - edge_start[0]) / length, (edge_end[1] - edge_start[1]) / length)
+        v = (-u[1], u[0])
+        while computeDot(hull[(right + 1) % n], u) > computeDot(hull[right], u):
+            right = (right + 1) % n
+        if i == 0:
+            top = right
+        while computeDot(hull[(top + 1) % n], v) > computeDot(hull[top], v):
+            top = (top + 1) % n
+        if i == 0:
+            left = top
+        while computeDot(hull[(left + 1) % n], u) < computeDot(hull[left], u):
+            left = (left + 1) % n
+
+        u_min = computeDot(hull[left], u)
+        u_max = computeDot(hull[right], u)
+        v_min = computeDot(edge_start, v)
+        v_max = computeDot(hull[top], v)
+        area = (u_max - u_min) * (v_max - v_min)
+        if best_area is None or area < best_area:
+            best_area = area
+            best_corners = [(a * u[0] + b * v[0], a * u[1] + b * v[1])
+                            for a, b in ((u_min, v_min), (u_max, v_min), (u_max, v_max), (u_min, v_max))]
+    return best_corners
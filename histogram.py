@@ -0,0 +1,114 @@
+# Histograms of 8 bit channel or greyscale images.
+# Every histogram is built from the counts of the 256 possible values, gathered in a single pass over the pixels,
+# and folded into the requested number of bins afterwards, so binning costs 256 operations instead of one
+# division per pixel. Rows can be added (and removed) one at a time, e.g. while a png is decoded.
+
+import argparse
+import itertools
+import statistics
+import time
+
+# Counts how often each of the values 0..255 occurs in a list of rows
+def computeValueCounts(pixel_array):
+    counts = [0] * 256
+    for row in pixel_array:
+        for value in row:
+            counts[value] += 1
+    return counts
+
+# Folds 256 value counts into nr_bins equally wide bins, value v goes into bin v * nr_bins // 256
+def foldValueCounts(counts, nr_bins):
+    histogram = [0] * nr_bins
+    for value in range(256):
+        histogram[value * nr_bins // 256] += counts[value]
+    return histogram
+
+# Histogram of the image_width x image_height pixels of an 8 bit pixel array with nr_bins equally wide bins
+def computeHistogram(pixel_array, image_width, image_height, nr_bins=256):
+    return foldValueCounts(computeValueCounts(row[:image_width] for row in pixel_array[:image_height]), nr_bins)
+
+# Running totals of a histogram: entry i holds the number of pixels in bins 0..i
+def computeCumulativeHistogram(histogram):
+    return list(itertools.accumulate(histogram))
+
+# A histogram that is updated one row at a time. Rows can be plain pixel rows or interleaved png rows,
+# channel and planes then pick one channel out of them (e.g. channel 1 of planes 3 is green).
+class StreamingHistogram:
+    def __init__(self, channel=0, planes=1):
+        self.counts = [0] * 256
+        self.channel = channel
+        self.planes = planes
+        self.pixels = 0
+
+    def addRow(self, row):
+        counts = self.counts
+        if self.planes > 1:
+            row = row[self.channel::self.planes]
+        for value in row:
+            counts[value] += 1
+        self.pixels += len(row)
+
+    # takes a row out again, for histograms over a sliding window of rows
+    def removeRow(self, row):
+        counts = self.counts
+        if self.planes > 1:
+            row = row[self.channel::self.planes]
+        for value in row:
+            counts[value] -= 1
+        self.pixels -= len(row)
+
+    def histogram(self, nr_bins=256):
+        return foldValueCounts(self.counts, nr_bins)
+
+    def cumulativeHistogram(self, nr_bins=256):
+        return computeCumulativeHistogram(self.histogram(nr_bins))
+
+# The straightforward version the benchmark compares against: one bin computation per pixel
+def computeHistogramPerPixel(pixel_array, image_width, image_height, nr_bins):
+    histogram = [0] * nr_bins
+    for y in range(image_height):
+        for x in range(image_width):
+            histogram[pixel_array[y][x] * nr_bins // 256] += 1
+    return histogram
+
+# Median run time of function() in milliseconds
+def timeMilliseconds(function, repeats):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+# Times the histogram of every channel of an image, per pixel binning against value counts and row streaming
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the histogram computation on an image")
+    parser.add_argument("image", nargs="?", default="krakow.png")
+    parser.add_argument("--bins", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    # the detectors import this module through adaptiveThreshold, so the png reading helpers are only imported here
+    import detectors
+    (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(args.image)
+    channels = {"red": px_array_r, "green": px_array_g, "blue": px_array_b}
+
+    print("{:<8} {:>12} {:>12} {:>12}".format("channel", "per pixel", "counts", "streaming"))
+    for name, pixel_array in channels.items():
+        expected = computeHistogramPerPixel(pixel_array, image_width, image_height, args.bins)
+        if computeHistogram(pixel_array, image_width, image_height, args.bins) != expected:
+            raise SystemExit("histogram mismatch on the {} channel".format(name))
+
+        def streaming():
+            histogram = StreamingHistogram()
+            for row in pixel_array:
+                histogram.addRow(row)
+            return histogram.histogram(args.bins)
+
+        per_pixel_ms = timeMilliseconds(lambda: computeHistogramPerPixel(pixel_array, image_width, image_height, args.bins), args.repeats)
+        counts_ms = timeMilliseconds(lambda: computeHistogram(pixel_array, image_width, image_height, args.bins), args.repeats)
+        streaming_ms = timeMilliseconds(streaming, args.repeats)
+        print("{:<8} {:>9.1f} ms {:>9.1f} ms {:>9.1f} ms".format(name, per_pixel_ms, counts_ms, streaming_ms))
+
+if __name__ == "__main__":
+    main()
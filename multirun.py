@@ -1,34 +1,545 @@
+# Batch runner: detects the plates of many images and prints one json line per image. The images are png files,
+# png members of zip and tar archives (read without extracting them) or, with --stdin, a stream of concatenated pngs
+# such as ffmpeg -f image2pipe -vcodec png - writes.
+# Decoding a png is mostly zlib inflation, which releases the GIL, so a small pool of decoder threads reads and
+# decodes the next images while the current one is detected. At most prefetch decoded images wait at a time, which
+# bounds the memory of the pipeline. Several worker processes each run such a pipeline, the images are handed out to
+# them largest first as they have room, with a cap on the pixels in flight on all of them together.
+
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing
+import multiprocessing.connection
 import os
-from threading import Thread
+import queue
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import archiveInput
+import batchJournal
+import detectors
+import resultCache
+import stageTimer
+
+# import our basic, light-weight png reader library
+import imageIO.png
+
+BUNDLED_IMAGES = ["numberplate1.png", "numberplate2.png", "numberplate3.png",
+                  "numberplate4.png", "numberplate5.png", "numberplate6.png"]
+
+# decoded images that may wait for the detection, and threads decoding them
+DEFAULT_PREFETCH = 2
+DEFAULT_DECODERS = 2
+
+# An image source is a png file name, an archiveInput.ArchiveMember or a (name, png bytes) pair, e.g. a frame
+# of a png stream. Archive members are named by their member name.
+def sourceName(source):
+    if isinstance(source, archiveInput.ArchiveMember):
+        return source.member
+    return source[0] if isinstance(source, tuple) else source
+
+# The png bytes of an image source
+def readSourceBytes(source):
+    if isinstance(source, archiveInput.ArchiveMember):
+        with archiveInput.openArchiveMember(source) as member_file:
+            return member_file.read()
+    if isinstance(source, tuple):
+        return source[1]
+    with open(source, "rb") as source_file:
+        return source_file.read()
+
+# Reads and decodes an image source, returns the decoded image, the seconds the decoding took and the content hash.
+# Without a journal the hash is None. With one (completed maps the journal keys of the finished images to their
+# results) the bytes are hashed first and an image already in the journal is not decoded at all, decoded is None.
+def decodeImage(source, completed=None, variant="detection", parameters=None):
+    start = time.perf_counter()
+    if completed is not None:
+        png_bytes = readSourceBytes(source)
+        content_hash = resultCache.computeContentHash(png_bytes)
+        if resultCache.computeCacheKey(content_hash, variant, parameters) in completed:
+            return None, 0.0, content_hash
+        return detectors.readRGBImageBytes(png_bytes), time.perf_counter() - start, content_hash
+    if isinstance(source, archiveInput.ArchiveMember):
+        decoded = archiveInput.readRGBImageMember(source)
+    elif isinstance(source, tuple):
+        decoded = detectors.readRGBImageBytes(source[1])
+    else:
+        decoded = detectors.readRGBImageFile(source)
+    return decoded, time.perf_counter() - start, None
+
+# The frames of a stream of concatenated pngs as image sources named frame000000, frame000001, ...
+def iterateStreamSources(stream):
+    for frame, png_bytes in enumerate(detectors.iteratePNGStream(stream)):
+        yield "frame{:06d}".format(frame), png_bytes
+
+# Yields the images of a source until it raises, the exception is appended to errors
+def iterateUntilError(images, errors):
+    try:
+        yield from images
+    except Exception as error:
+        errors.append(error)
+
+# Yields image source, decoded image (or the exception the decoding raised), decode seconds and content hash in
+# input order, decode is called with the image source. The decoder threads work up to prefetch images ahead of
+# the consumer, prefetch 0 decodes every image only when it is needed. images can be a generator, it is only
+# advanced as far as the prefetch reaches. An exception of the generator itself, like a broken png stream, is
+# raised after the images read before it.
+def iterateDecodedImages(images, prefetch=DEFAULT_PREFETCH, decoders=DEFAULT_DECODERS, decode=decodeImage):
+    if prefetch <= 0:
+        for image in images:
+            try:
+                decoded, seconds, content_hash = decode(image)
+            except Exception as error:
+                decoded, seconds, content_hash = error, 0.0, None
+            yield image, decoded, seconds, content_hash
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, decoders)) as executor:
+        pending = deque()
+        source_errors = []
+        images = iterateUntilError(images, source_errors)
+        for image in itertools.islice(images, prefetch):
+            pending.append((image, executor.submit(decode, image)))
+        while pending:
+            image, future = pending.popleft()
+            # keep the queue full while the image just taken is detected
+            next_image = next(images, None)
+            if next_image is not None:
+                pending.append((next_image, executor.submit(decode, next_image)))
+            try:
+                decoded, seconds, content_hash = future.result()
+            except Exception as error:
+                decoded, seconds, content_hash = error, 0.0, None
+            yield image, decoded, seconds, content_hash
+        if source_errors:
+            raise source_errors[0]
+
+# Detects the plates of one decoded image source and returns its json result with the image name, the decode
+# and detection milliseconds and the milliseconds spent waiting for the decoders. An image that couldn't be read
+# or detected gets an "error" entry instead of a bbox. An image found in the journal (decoded is None) gets its
+# journaled result with "resumed" set and without the timings of the run that journaled it, see processBatch.
+def detectDecodedImage(image, decoded, decode_seconds, content_hash, wait_seconds, variant="detection", parameters=None, completed=None):
+    if decoded is None:
+        result = dict(completed[resultCache.computeCacheKey(content_hash, variant, parameters)])
+        for name in ("decode_ms", "wait_ms", "detect_ms", "archive"):
+            result.pop(name, None)
+        result["image"] = sourceName(image)
+        if isinstance(image, archiveInput.ArchiveMember):
+            result["archive"] = image.archive
+        result["resumed"] = True
+        return result
+    start = time.perf_counter()
+    try:
+        if isinstance(decoded, Exception):
+            raise decoded
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = decoded
+        result = detectors.runDetection(variant, px_array_r, px_array_g, px_array_b, image_width, image_height, parameters)
+    except Exception as error:
+        result = {"error": "{}: {}".format(type(error).__name__, error)}
+    result["image"] = sourceName(image)
+    if isinstance(image, archiveInput.ArchiveMember):
+        result["archive"] = image.archive
+    result["decode_ms"] = round(decode_seconds * 1000, 1)
+    result["wait_ms"] = round(wait_seconds * 1000, 1)
+    result["detect_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    if content_hash is not None:
+        result["content_hash"] = content_hash
+    return result
+
+# Detects the plates of the image sources through the decode pipeline and yields one json result per image,
+# see detectDecodedImage. With completed, the finished images of a journal (see batchJournal.py), every result gets
+# the "content_hash" of its input, and the images found in the journal yield their journaled result with
+# "resumed" set instead of being detected again.
+def processBatch(images, variant="detection", parameters=None, prefetch=DEFAULT_PREFETCH, decoders=DEFAULT_DECODERS, completed=None):
+    decode = functools.partial(decodeImage, completed=completed, variant=variant, parameters=parameters)
+    wait_start = time.perf_counter()
+    for image, decoded, decode_seconds, content_hash in iterateDecodedImages(images, prefetch, decoders, decode):
+        wait_seconds = time.perf_counter() - wait_start
+        result = detectDecodedImage(image, decoded, decode_seconds, content_hash, wait_seconds, variant, parameters, completed)
+        decoded = None
+        yield result
+        wait_start = time.perf_counter()
+
+# Number of pixels of an image source read from its png header, 0 if the header can't be read.
+# Archive handles opened for it stay open in this thread until archiveInput.closeArchives.
+def probeImagePixels(source):
+    try:
+        if isinstance(source, archiveInput.ArchiveMember):
+            with archiveInput.openArchiveMember(source) as member_file:
+                reader = imageIO.png.Reader(file=member_file)
+                reader.preamble()
+        elif isinstance(source, tuple):
+            reader = imageIO.png.Reader(bytes=source[1])
+            reader.preamble()
+        else:
+            with open(source, "rb") as source_file:
+                reader = imageIO.png.Reader(file=source_file)
+                reader.preamble()
+        return reader.width * reader.height
+    except (OSError, imageIO.png.Error, KeyError):
+        return 0
+
+# Order of the waiting images of the scheduler, entries are (pixels, task, image source): largest first, images
+# of equal size in input order. Members of compressed tars follow in archive order, see archiveInput.isSequentialMember.
+def scheduleKey(entry):
+    pixels, task, image = entry
+    if archiveInput.isSequentialMember(image):
+        return (1, 0, task)
+    return (0, -pixels, task)
+
+# Worker process of the scheduler: detects the images sent to its inbox as (task, image source) pairs and reports
+# to the parent over its end of a pipe: ("start", task) when it takes up an image, ("stage", task, name, stage times)
+# when a detection stage starts, ("result", task, result, busy seconds) and ("done",) after the None that ends its
+# inbox. Failed images get the milliseconds of their stages as "stage_ms". The images already sent are decoded ahead
+# by the decoder threads, the inbox is only waited on when nothing is left to detect. memory_limit caps the data
+# segment of the process in bytes (the heap, RLIMIT_DATA). A worker that runs out of memory reports the image and
+# ends, the parent replaces it.
+def runScheduledWorker(inbox, connection, variant, parameters, decoders, completed, memory_limit=None):
+    current = {"task": None}
+
+    def reportStage(name, stage_times):
+        connection.send(("stage", current["task"], name, dict(stage_times)))
+
+    decode = functools.partial(decodeImage, completed=completed, variant=variant, parameters=parameters)
+    with stageTimer.StageTimer(detectors.VARIANTS[variant], reportStage) as timer, ThreadPoolExecutor(max_workers=max(1, decoders)) as executor:
+        if memory_limit is not None:
+            # the decoder threads are started before the limit applies, a thread that can't get its stack under the
+            # limit never finishes starting. Every thread waits at the barrier, so each submit starts a new one.
+            barrier = threading.Barrier(max(1, decoders) + 1)
+            for i in range(max(1, decoders)):
+                executor.submit(barrier.wait)
+            barrier.wait()
+            import resource
+            soft, hard = resource.getrlimit(resource.RLIMIT_DATA)
+            resource.setrlimit(resource.RLIMIT_DATA, (memory_limit if hard == resource.RLIM_INFINITY else min(memory_limit, hard), hard))
+            # a decoder thread can run out of memory outside of its image and die without completing it,
+            # the process ends then so the parent replaces it instead of waiting for that image forever
+            threading.excepthook = lambda hook_args: os._exit(1)
+        pending = deque()
+        finished = False
+        while True:
+            while not finished:
+                try:
+                    message = inbox.get(block=not pending)
+                except queue.Empty:
+                    break
+                if message is None:
+                    finished = True
+                else:
+                    pending.append((message, executor.submit(decode, message[1])))
+            if not pending:
+                break
+            (task, image), future = pending.popleft()
+            current["task"] = task
+            timer.reset()
+            connection.send(("start", task))
+            wait_start = time.perf_counter()
+            try:
+                decoded, decode_seconds, content_hash = future.result()
+            except Exception as error:
+                decoded, decode_seconds, content_hash = error, 0.0, None
+            start = time.perf_counter()
+            result = detectDecodedImage(image, decoded, decode_seconds, content_hash, start - wait_start, variant, parameters, completed)
+            decoded = None
+            if "error" in result:
+                result["stage_ms"] = {name: round(seconds * 1000, 1) for name, seconds in timer.stage_times.items()}
+            connection.send(("result", task, result, time.perf_counter() - start))
+            if result.get("error", "").startswith("MemoryError"):
+                # the heap may be in any state after a failed allocation
+                return
+    connection.send(("done",))
+
+# A worker process of the scheduler with the images it holds (task: (pixels, image source)), the image it is
+# working on and the stages that image went through. start replaces a stopped worker by a fresh process.
+class ScheduledWorker:
+    def __init__(self, index, variant, parameters, decoders, completed, memory_limit=None):
+        self.index = index
+        self.worker_args = (variant, parameters, decoders, completed, memory_limit)
+        self.images = 0
+        self.busy_seconds = 0.0
+        self.recycled = 0
+        self.start()
+
+    def start(self):
+        self.inbox = multiprocessing.Queue()
+        self.connection, child_connection = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=runScheduledWorker, args=(self.inbox, child_connection) + self.worker_args)
+        self.process.start()
+        child_connection.close()
+        self.in_flight = {}
+        self.closing = False
+        self.finished = False
+        self.started_images = 0
+        self.current = None
+        self.current_start = 0.0
+        self.stage = None
+        self.stage_times = {}
+
+    def send(self, task, pixels, image):
+        self.in_flight[task] = (pixels, image)
+        self.inbox.put((task, image))
+
+    def close(self):
+        self.inbox.put(None)
+        self.closing = True
+
+    # Stops the process and returns the images it held but didn't finish
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+        self.inbox.close()
+        held, self.in_flight = self.in_flight, {}
+        return held
+
+    # Marks a stopped worker as done, it gets no more images and its closed inbox is not written to again
+    def retire(self):
+        self.closing = True
+        self.finished = True
+
+# Result of an image whose worker was stopped, with the stages the worker had timed so far and the last one it started
+def failedImageResult(image, error, seconds, stage, stage_times):
+    result = {"error": error, "image": sourceName(image)}
+    if isinstance(image, archiveInput.ArchiveMember):
+        result["archive"] = image.archive
+    result["decode_ms"] = 0.0
+    result["wait_ms"] = 0.0
+    result["detect_ms"] = round(seconds * 1000, 1)
+    result["last_stage"] = stage
+    result["stage_ms"] = {name: round(stage_seconds * 1000, 1) for name, stage_seconds in stage_times.items()}
+    return result
+
+# Runs the batch on workers processes with a longest processing time first schedule: the image sizes are probed
+# from the png headers, and whenever a worker has room the largest waiting image goes to it, the members of
+# compressed tars go last in archive order. Every worker holds at most prefetch + 1 images, and the images in flight
+# on all workers together hold at most max_pixels pixels (None for no limit), the largest image that still fits is
+# sent first. Yields the results as they arrive.
+# A worker that spends more than timeout seconds on one image is killed, one whose heap would grow beyond
+# memory_limit bytes ends itself, and one that dies is noticed. The image it was working on is reported as failed,
+# the others it held go back to the waiting images and a fresh worker takes its place. Any limit runs the batch in
+# worker processes, even a single one. Without limits, a single worker or a generator of image sources, like a png
+# stream, is processed in this process. completed as for processBatch. utilization, if given, receives images,
+# busy seconds, utilization and recycled processes of every worker.
+def runBatch(images, variant="detection", parameters=None, workers=1, prefetch=DEFAULT_PREFETCH, decoders=DEFAULT_DECODERS,
+             completed=None, max_pixels=None, utilization=None, timeout=None, memory_limit=None):
+    workers = max(1, min(workers, len(images))) if isinstance(images, list) else 1
+    start = time.perf_counter()
+    if workers == 1 and timeout is None and memory_limit is None:
+        count = 0
+        busy_seconds = 0.0
+        for result in processBatch(images, variant, parameters, prefetch, decoders, completed):
+            count += 1
+            # a resumed result carries the detection time of the run that journaled it
+            if not result.get("resumed"):
+                busy_seconds += result.get("detect_ms", 0.0) / 1000
+            yield result
+        if utilization is not None:
+            seconds = time.perf_counter() - start
+            utilization.append({"worker": 0, "images": count, "busy_seconds": busy_seconds,
+                                "utilization": busy_seconds / seconds if seconds > 0 else 0.0, "recycled": 0})
+        return
+    if not isinstance(images, list):
+        raise ValueError("time and memory limits need image files or archives, not a stream")
+
+    # longest first, see scheduleKey. The archives opened for the headers are closed again before the workers fork,
+    # see archiveInput.listArchiveMembers.
+    waiting = sorted(((probeImagePixels(image), task, image) for task, image in enumerate(images)), key=scheduleKey)
+    archiveInput.closeArchives()
+    slots = [ScheduledWorker(index, variant, parameters, decoders, completed, memory_limit) for index in range(workers)]
+
+    try:
+        while not all(slot.finished for slot in slots):
+            # hand out the largest waiting images that fit, an image always fits when nothing is in flight. Every
+            # worker gets an image to detect before any worker gets images to decode ahead.
+            for depth in range(1, prefetch + 2):
+                for slot in slots:
+                    if not waiting or slot.closing or len(slot.in_flight) >= depth:
+                        continue
+                    pixels_in_flight = sum(pixels for other in slots for pixels, image in other.in_flight.values())
+                    index = next((i for i, entry in enumerate(waiting)
+                                  if max_pixels is None or pixels_in_flight == 0 or pixels_in_flight + entry[0] <= max_pixels), None)
+                    if index is None:
+                        continue
+                    pixels, task, image = waiting.pop(index)
+                    slot.send(task, pixels, image)
+            for slot in slots:
+                if not waiting and not slot.in_flight and not slot.closing:
+                    # nothing left for this worker, let it finish
+                    slot.close()
+
+            running = [slot for slot in slots if not slot.finished]
+            wait_seconds = None
+            if timeout is not None:
+                deadlines = [slot.current_start + timeout for slot in running if slot.current is not None]
+                if deadlines:
+                    wait_seconds = max(0.0, min(deadlines) - time.perf_counter())
+            multiprocessing.connection.wait([slot.connection for slot in running] + [slot.process.sentinel for slot in running], wait_seconds)
+
+            for slot in running:
+                # the messages of a worker are read before its end is noticed
+                while slot.connection.poll():
+                    try:
+                        message = slot.connection.recv()
+                    except EOFError:
+                        break
+                    if message[0] == "start":
+                        slot.current = message[1]
+                        slot.current_start = time.perf_counter()
+                        slot.started_images += 1
+                        slot.stage = None
+                        slot.stage_times = {}
+                    elif message[0] == "stage":
+                        slot.stage, slot.stage_times = message[2], message[3]
+                    elif message[0] == "result":
+                        task, result, busy_seconds = message[1:]
+                        del slot.in_flight[task]
+                        slot.current = None
+                        slot.images += 1
+                        slot.busy_seconds += busy_seconds
+                        yield result
+                    else:
+                        slot.finished = True
+                if slot.finished:
+                    slot.stop()
+                    slot.retire()
+                    continue
+
+                elapsed = time.perf_counter() - slot.current_start
+                if timeout is not None and slot.current is not None and elapsed > timeout:
+                    error = "TimeoutError: no result after {:.1f} s".format(timeout)
+                elif not slot.process.is_alive():
+                    if slot.started_images == 0 and slot.in_flight:
+                        raise RuntimeError("worker {} ended with exit code {} before taking up an image, is the memory limit too low?".format(
+                            slot.index, slot.process.exitcode))
+                    error = "WorkerError: worker ended with exit code {}".format(slot.process.exitcode)
+                else:
+                    continue
+                held = slot.stop()
+                if slot.current is not None:
+                    pixels, image = held.pop(slot.current)
+                    slot.images += 1
+                    slot.busy_seconds += elapsed
+                    yield failedImageResult(image, error, elapsed, slot.stage, slot.stage_times)
+                waiting.extend((pixels, task, image) for task, (pixels, image) in held.items())
+                waiting.sort(key=scheduleKey)
+                slot.recycled += 1
+                if waiting:
+                    slot.start()
+                else:
+                    slot.retire()
+    finally:
+        for slot in slots:
+            if not slot.finished:
+                slot.stop()
+
+    if utilization is not None:
+        seconds = time.perf_counter() - start
+        utilization.extend({"worker": slot.index, "images": slot.images, "busy_seconds": slot.busy_seconds,
+                            "utilization": slot.busy_seconds / seconds if seconds > 0 else 0.0, "recycled": slot.recycled}
+                           for slot in slots)
+
+# Running totals of a batch for printSummary, the results themselves are not kept so that a png stream of any
+# length runs in constant memory
+def newBatchSummary():
+    return {"images": 0, "resumed": 0, "errors": 0, "decode_ms": 0.0, "wait_ms": 0.0, "detect_ms": 0.0}
+
+# Adds one result to the summary, images resumed from a journal only count as images
+def addToSummary(summary, result):
+    summary["images"] += 1
+    if result.get("resumed"):
+        summary["resumed"] += 1
+        return
+    if "error" in result:
+        summary["errors"] += 1
+    summary["decode_ms"] += result["decode_ms"]
+    summary["wait_ms"] += result["wait_ms"]
+    summary["detect_ms"] += result["detect_ms"]
 
-def task1():
-    os.system("python CS373LicensePlateDetection.py numberplate1.png")
+# Prints the time spent decoding, waiting for decoded images and detecting
+def printSummary(summary, seconds):
+    print("{} images, {} resumed, {} errors in {:.1f} s: decoding {:.0f} ms, waiting for decoders {:.0f} ms, detection {:.0f} ms".format(
+        summary["images"], summary["resumed"], summary["errors"], seconds, summary["decode_ms"], summary["wait_ms"], summary["detect_ms"]),
+        file=sys.stderr)
 
-def task2():
-    os.system("python CS373LicensePlateDetection.py numberplate2.png")
+# Prints how many images every worker detected, the share of the wall time it spent detecting them and how often
+# its process was replaced after hitting a limit
+def printUtilization(utilization):
+    for worker in utilization:
+        print("worker {}: {} images, busy {:.1f} s, utilization {:.0%}, recycled {} times".format(
+            worker["worker"], worker["images"], worker["busy_seconds"], worker["utilization"], worker["recycled"]), file=sys.stderr)
 
-def task3():
-    os.system("python CS373LicensePlateDetection.py numberplate3.png")
+def main():
+    parser = argparse.ArgumentParser(description="Detect the plates of many images with decoding overlapped with detection")
+    parser.add_argument("images", nargs="*", default=BUNDLED_IMAGES, help="png files and zip or tar archives of pngs")
+    parser.add_argument("--variant", default="detection", choices=sorted(detectors.VARIANTS))
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a detector parameter")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                        help="decoded images waiting per worker, 0 decodes each image only when it is needed")
+    parser.add_argument("--decoders", type=int, default=DEFAULT_DECODERS, help="decoder threads per worker")
+    parser.add_argument("--max-inflight-mpixels", type=float,
+                        help="megapixels of the images handed out to all workers at a time (default no limit)")
+    parser.add_argument("--timeout", type=float, help="seconds a worker may spend on one image before it is replaced")
+    parser.add_argument("--memory-limit-mb", type=float, help="heap of a worker process, a worker that runs out is replaced")
+    parser.add_argument("--stdin", action="store_true", help="read a stream of concatenated pngs from stdin instead of files")
+    parser.add_argument("--journal", help="append finished results to this file and skip the images already in it")
+    parser.add_argument("--checkpoint-seconds", type=float, default=batchJournal.DEFAULT_CHECKPOINT_SECONDS,
+                        help="fsync every journal line at most this many seconds after it was written")
+    args = parser.parse_args()
 
-def task4():
-    os.system("python CS373LicensePlateDetection.py numberplate4.png")
+    try:
+        parameters = detectors.parseParameters(args.variant, args.set)
+    except ValueError as error:
+        parser.error(str(error))
 
-def task5():
-    os.system("python CS373LicensePlateDetection.py numberplate5.png")
+    try:
+        images = archiveInput.expandArchives(args.images)
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as error:
+        parser.error(str(error))
+    if args.stdin:
+        if args.timeout is not None or args.memory_limit_mb is not None:
+            parser.error("--timeout and --memory-limit-mb need image files or archives, not --stdin")
+        images = iterateStreamSources(imageIO.png.binary_stdin())
+    memory_limit = int(args.memory_limit_mb * 2**20) if args.memory_limit_mb is not None else None
 
-def task6():
-    os.system("python CS373LicensePlateDetection.py numberplate6.png")
+    journal = None
+    completed = None
+    if args.journal:
+        journal = batchJournal.BatchJournal(args.journal, args.checkpoint_seconds)
+        completed = journal.load()
 
-t1 = Thread(target=task1)
-t2 = Thread(target=task2)
-t3 = Thread(target=task3)
-t4 = Thread(target=task4)
-t5 = Thread(target=task5)
-t6 = Thread(target=task6)
+    max_pixels = args.max_inflight_mpixels * 1e6 if args.max_inflight_mpixels is not None else None
+    utilization = []
+    start = time.perf_counter()
+    summary = newBatchSummary()
+    try:
+        for result in runBatch(images, args.variant, parameters, args.workers, args.prefetch, args.decoders, completed, max_pixels, utilization,
+                               args.timeout, memory_limit):
+            addToSummary(summary, result)
+            if journal is not None and not result.get("resumed") and "error" not in result:
+                journal.append(result, args.variant, parameters)
+            print(json.dumps(result))
+            sys.stdout.flush()
+    except imageIO.png.Error as error:
+        # a broken png stream can't be resynchronised, the frames before it are reported
+        printSummary(summary, time.perf_counter() - start)
+        sys.exit("png stream broken after {} frames: {}".format(summary["images"], error))
+    except RuntimeError as error:
+        printSummary(summary, time.perf_counter() - start)
+        sys.exit(str(error))
+    finally:
+        if journal is not None:
+            journal.close()
+    printSummary(summary, time.perf_counter() - start)
+    printUtilization(utilization)
 
-t1.start()
-t2.start()
-t3.start()
-t4.start()
-t5.start()
-t6.start()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import time
+from collections import OrderedDict
+
+import CS373LicensePlateDetection as detection
+import CS373Extension as extension
+import detectors
+import adaptiveThreshold
+import plateCandidates
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# rough cost of one pixel of a list of lists image: one 8 byte pointer per element, the small ints themselves are shared
+BYTES_PER_PIXEL = 8
+
+# Bounded least recently used store for stage outputs, entries are evicted once their estimated size
+# exceeds max_bytes. A single output larger than the whole budget is returned but not kept.
+class StageMemo:
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.used_bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.used_bytes += size
+        while self.used_bytes > self.max_bytes:
+            evicted_key, (evicted_value, evicted_size) = self.entries.popitem(last=False)
+            self.used_bytes -= evicted_size
+            self.evictions += 1
+
+    # removes every entry that belongs to one image
+    def discardImage(self, image_key):
+        for key in [key for key in self.entries if key[0] == image_key]:
+            self.used_bytes -= self.entries.pop(key)[1]
+
+# Copies a list of lists image, stages that work in place get a copy so the memoized input stays intact
+def copyPixelArray(pixel_array):
+    return [list(row) for row in pixel_array]
+
+def greyscaleStage(image, upstream, parameters):
+    px_array_r, px_array_g, px_array_b, image_width, image_height = image
+    return detection.computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+
+def standardDeviationStage(image, upstream, parameters):
+    return detection.computeStretchedStandardDeviationImage(upstream, image[3], image[4], parameters["contrast"])
+
+def thresholdStage(image, upstream, parameters):
+    return detection.computeAdaptiveThresholdGE(copyPixelArray(upstream), parameters["thresholdValue"], image[3], image[4])
+
+def closingStage(image, upstream, parameters):
+    return detection.computeClosing8Nbh3x3FlatSE(upstream, image[3], image[4], parameters["closingIterations"])
+
+# the labelled image, the component sizes and the per component statistics
+def componentsStage(image, upstream, parameters):
+    image_width, image_height = image[3], image[4]
+    connectedComponents_array, connectedComponents_labels = detection.computeProfileCheckedLabeling(copyPixelArray(upstream), image_width, image_height, parameters["minBandPixels"])
+    stats = plateCandidates.computeComponentStatistics(connectedComponents_array, len(connectedComponents_labels) - 1, image_width, image_height)
+    return connectedComponents_array, connectedComponents_labels, stats
+
+def detectionPlateStage(image, upstream, parameters):
+    connectedComponents_array, connectedComponents_labels, stats = upstream
+    return detection.selectPlateBoundingBox(stats, connectedComponents_labels, parameters["ratioMin"], parameters["ratioMax"])
+
+def extensionPlateStage(image, upstream, parameters):
+    connectedComponents_array, connectedComponents_labels, stats = upstream
+    if len(connectedComponents_labels) == 1:
+        return None, None
+    return extension.selectPlateBoundary(connectedComponents_array, list(connectedComponents_labels), image[3], image[4],
+                                         parameters["ratioMin"], parameters["ratioMax"], parameters["angleVariance"],
+                                         parameters["boxFitting"])
+
+# The stages in pipeline order: name, function, the parameters it depends on and how many full size images its
+# output holds (for the memory budget). Each stage gets the output of the stage before it.
+SHARED_STAGES = [("greyscale", greyscaleStage, (), 1),
+                 ("stdDev", standardDeviationStage, ("contrast",), 1),
+                 ("threshold", thresholdStage, ("thresholdValue",), 1),
+                 ("closing", closingStage, ("closingIterations",), 1),
+                 ("components", componentsStage, ("minBandPixels",), 1)]
+
+PLATE_STAGES = {"detection": ("plate", detectionPlateStage, ("ratioMin", "ratioMax"), 0),
+                "extension": ("plate", extensionPlateStage, ("ratioMin", "ratioMax", "angleVariance", "boxFitting"), 0)}
+
+# Runs the detection as a chain of memoized stages. The output of every stage is kept in a StageMemo keyed by the
+# image, the stage and the parameters of that stage and all stages before it, so a parameter sweep only re-executes
+# the stages downstream of the parameter that changed, e.g. a sweep over N thresholds computes the standard
+# deviation image once. Both variants share everything up to the components stage.
+class PipelineGraph:
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET):
+        self.memo = StageMemo(max_bytes)
+        self.images = {}
+        self.stage_seconds = {}
+        self.stage_runs = {}
+        # compute time of every stage output ever produced, by memo key, kept even after the output is evicted
+        self.key_seconds = {}
+
+    # registers the r, g, b pixel arrays of an image under a key, e.g. its file name or content hash
+    def addImage(self, image_key, px_array_r, px_array_g, px_array_b, image_width, image_height):
+        self.images[image_key] = (px_array_r, px_array_g, px_array_b, image_width, image_height)
+
+    # forgets an image and all of its memoized stage outputs
+    def removeImage(self, image_key):
+        self.images.pop(image_key, None)
+        self.memo.discardImage(image_key)
+
+    # the memo keys of all stages of a variant, in pipeline order
+    def stageKeys(self, image_key, variant, parameters):
+        keys = []
+        key = (image_key,)
+        for name, function, parameter_names, images_held in SHARED_STAGES + [PLATE_STAGES[variant]]:
+            key = key + ((name if name != "plate" else variant,) + tuple(parameters[parameter] for parameter in parameter_names),)
+            keys.append(key)
+        return keys
+
+    # what running a configuration from scratch costs: the summed compute time of all its stages,
+    # only known once the configuration has been run
+    def configurationSeconds(self, image_key, variant, parameters):
+        settings = detectors.defaultParameters(variant)
+        settings.update(parameters)
+        return sum(self.key_seconds.get(key, 0.0) for key in self.stageKeys(image_key, variant, settings))
+
+    # returns the output of the last stage of a variant for an image, computing only what isn't memoized yet
+    def run(self, image_key, variant, parameters):
+        image = self.images[image_key]
+        stages = SHARED_STAGES + [PLATE_STAGES[variant]]
+        pixels = image[3] * image[4]
+
+        # find the last stage whose output is memoized, walking up from the end of the pipeline
+        keys = self.stageKeys(image_key, variant, parameters)
+        start_index = 0
+        upstream = None
+        for index in range(len(stages) - 1, -1, -1):
+            value = self.memo.get(keys[index])
+            if value is not None:
+                upstream = value
+                start_index = index + 1
+                break
+
+        for index in range(start_index, len(stages)):
+            name, function, parameter_names, images_held = stages[index]
+            start = time.perf_counter()
+            upstream = function(image, upstream, parameters)
+            seconds = time.perf_counter() - start
+            self.key_seconds[keys[index]] = seconds
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            self.stage_runs[name] = self.stage_runs.get(name, 0) + 1
+            self.memo.put(keys[index], upstream, max(1, images_held * pixels * BYTES_PER_PIXEL))
+        return upstream
+
+    # runs a variant with the given parameters (missing ones take the variant defaults) and returns json data
+    def detect(self, image_key, variant, parameters=None):
+        settings = detectors.defaultParameters(variant)
+        settings.update(parameters or {})
+        return detectors.detectionResult(variant, self.run(image_key, variant, settings))
+
+# Sweeps the threshold over one image and reports which stages actually ran
+def main():
+    parser = argparse.ArgumentParser(description="Sweep detector thresholds over an image with memoized stages")
+    parser.add_argument("image")
+    parser.add_argument("--variant", default="detection", choices=sorted(detectors.VARIANTS))
+    parser.add_argument("--thresholds", default="120,135,150,165,180")
+    parser.add_argument("--memory-mb", type=float, default=DEFAULT_MEMORY_BUDGET / (1024 * 1024))
+    args = parser.parse_args()
+
+    graph = PipelineGraph(int(args.memory_mb * 1024 * 1024))
+    (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(args.image)
+    graph.addImage(args.image, px_array_r, px_array_g, px_array_b, image_width, image_height)
+    for threshold in args.thresholds.split(","):
+        start = time.perf_counter()
+        result = graph.detect(args.image, args.variant, {"thresholdValue": adaptiveThreshold.parseThreshold(threshold)})
+        print("threshold {}: {} in {:.2f} s".format(threshold, result, time.perf_counter() - start))
+    print("stage runs: {}".format(graph.stage_runs))
+    print("memo: {} hits, {} misses, {} evictions, {:.1f} MB held".format(
+        graph.memo.hits, graph.memo.misses, graph.memo.evictions, graph.memo.used_bytes / (1024 * 1024)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import heapq
+
+# aspect ratio window (width / height) of a licence plate, components outside it are scored down
+EXPECTED_RATIO_MIN = 2
+EXPECTED_RATIO_MAX = 5
+
+# fraction of a plate's pixels that are edges in the thresholded standard deviation image
+EXPECTED_EDGE_DENSITY = 0.3
+
+# components smaller than this many pixels are never reported as candidates
+MIN_CANDIDATE_AREA = 50
+
+# exponents of the individual scores in the combined candidate score, the area counts less than
+# the shape scores so that a plate can win against a larger but badly shaped blob
+SCORE_WEIGHTS = {"area": 0.5, "ratio": 1.0, "fill": 1.0, "edges": 1.0}
+
+# indices into the per label statistics lists
+AREA = 0
+MIN_X = 1
+MAX_X = 2
+MIN_Y = 3
+MAX_Y = 4
+EDGE_COUNT = 5
+
+# Collects the statistics of every component in a single pass over the labelled image.
+# Returns a list indexed by label with [area, min_x, max_x, min_y, max_y, edge_count] entries, label 0 is unused.
+# edge_array is the binary image before morphology, edge_count is the number of its foreground pixels
+# inside the component. Labels without pixels keep the bounds an empty scan would give.
+def computeComponentStatistics(connectedComponents_array, labelCount, image_width, image_height, edge_array=None):
+    stats = [[0, image_width, 0, image_height, 0, 0] for label in range(labelCount + 1)]
+    for y in range(image_height):
+        row = connectedComponents_array[y]
+        edge_row = edge_array[y] if edge_array is not None else None
+        for x in range(image_width):
+            label = row[x]
+            if label <= 0:
+                continue
+            entry = stats[label]
+            if entry[AREA] == 0:
+                entry[MIN_X] = x
+                entry[MIN_Y] = y
+            entry[AREA] += 1
+            if x < entry[MIN_X]:
+                entry[MIN_X] = x
+            if x > entry[MAX_X]:
+                entry[MAX_X] = x
+            if y > entry[MAX_Y]:
+                entry[MAX_Y] = y
+            if edge_row is not None and edge_row[x] > 0:
+                entry[EDGE_COUNT] += 1
+    return stats
+
+# Yields the component labels from the largest to the smallest component using a heap over the sizes,
+# components of equal size come out in label order. The labels list is not modified.
+def iterateLabelsBySize(connectedComponents_labels):
+    heap = [(-size, label) for label, size in enumerate(connectedComponents_labels) if label > 0 and size > 0]
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)[1]
+
+# Returns the bounding box of a component as min_x, max_x, min_y, max_y
+def statisticsBoundingBox(entry):
+    return entry[MIN_X], entry[MAX_X], entry[MIN_Y], entry[MAX_Y]
+
+# Intersection over union of two inclusive bounding boxes given as min_x, max_x, min_y, max_y
+def computeBoundingBoxIoU(a, b):
+    overlap_x = min(a[1], b[1]) - max(a[0], b[0]) + 1
+    overlap_y = min(a[3], b[3]) - max(a[2], b[2]) + 1
+    if overlap_x <= 0 or overlap_y <= 0:
+        return 0.0
+    intersection = overlap_x * overlap_y
+    area_a = (a[1] - a[0] + 1) * (a[3] - a[2] + 1)
+    area_b = (b[1] - b[0] + 1) * (b[3] - b[2] + 1)
+    return intersection / (area_a + area_b - intersection)
+
+# Scores a component on how plate like it is, returns the score and the individual features
+def scoreComponent(entry, largestArea):
+    width = entry[MAX_X] - entry[MIN_X] + 1
+    height = entry[MAX_Y] - entry[MIN_Y] + 1
+    ratio = width / height
+    if ratio < EXPECTED_RATIO_MIN:
+        ratio_score = ratio / EXPECTED_RATIO_MIN
+    elif ratio > EXPECTED_RATIO_MAX:
+        ratio_score = EXPECTED_RATIO_MAX / ratio
+    else:
+        ratio_score = 1.0
+    fill = entry[AREA] / (width * height)
+    edge_density = entry[EDGE_COUNT] / entry[AREA]
+    features = {"area": entry[AREA], "ratio": ratio, "fill": fill, "edge_density": edge_density}
+
+    score = ((entry[AREA] / largestArea) ** SCORE_WEIGHTS["area"]
+             * ratio_score ** SCORE_WEIGHTS["ratio"]
+             * fill ** SCORE_WEIGHTS["fill"]
+             * min(1.0, edge_density / EXPECTED_EDGE_DENSITY) ** SCORE_WEIGHTS["edges"])
+    return score, features
+
+# Scores every component and returns the top_k plate candidates, best first.
+# Each candidate is a dict with the label, score, bbox (min_x, max_x, min_y, max_y) and the score features.
+def rankPlateCandidates(stats, top_k):
+    largestArea = max([entry[AREA] for entry in stats], default=0)
+    if largestArea == 0:
+        return []
+
+    candidates = []
+    for label in range(1, len(stats)):
+        entry = stats[label]
+        if entry[AREA] < MIN_CANDIDATE_AREA:
+            continue
+        score, features = scoreComponent(entry, largestArea)
+        candidate = {"label": label, "score": score, "bbox": statisticsBoundingBox(entry)}
+        candidate.update(features)
+        candidates.append(candidate)
+
+    return heapq.nlargest(top_k, candidates, key=lambda candidate: candidate["score"])
@@ -0,0 +1,97 @@
+# Projection profile check between the morphology and the connected component labeling.
+# A plate leaves a band of consecutive rows that each hold a good number of foreground pixels in the closed image,
+# with a long run of occupied columns inside the band. Counting the foreground pixels per row and per column is
+# much cheaper than labeling every blob, so a frame without any such band is not labelled at all and reports no
+# plate, and in the other frames the labeling only starts components from rows inside a band. minBandPixels 0
+# switches the check off.
+
+# a band must be at least this many rows high
+MIN_BAND_HEIGHT = 8
+
+# Counters of the frames and pixels seen by the check: frames skipped because no band qualified, and pixels that
+# never started a component, all pixels of a skipped frame and the rows outside the bands of the others. Every
+# caller that wants them passes its own.
+def newProfileStatistics():
+    return {"frames": 0, "skipped_frames": 0, "pixels": 0, "skipped_pixels": 0}
+
+# Adds the outcome of the check of one frame to statistics (None counts nothing)
+def recordProfileCheck(statistics, image_width, image_height, bands):
+    if statistics is None:
+        return
+    statistics["frames"] += 1
+    statistics["pixels"] += image_width * image_height
+    statistics["skipped_pixels"] += image_width * (image_height - sum(end - start for start, end in bands))
+    if bands == []:
+        statistics["skipped_frames"] += 1
+
+# Number of foreground (non zero) pixels in every row
+def computeRowProfile(pixel_array, image_width, image_height):
+    return [image_width - pixel_array[y].count(0) for y in range(image_height)]
+
+# Number of foreground pixels in every column of the rows start..end-1
+def computeColumnProfile(pixel_array, start, end):
+    return [len(column) - column.count(0) for column in zip(*pixel_array[start:end])]
+
+# Length of the longest run of non zero entries of a profile
+def computeLongestRun(profile):
+    longest = 0
+    run = 0
+    for count in profile:
+        run = run + 1 if count > 0 else 0
+        longest = max(longest, run)
+    return longest
+
+# Returns the bands (start row, end row exclusive) of plate like density: at least MIN_BAND_HEIGHT consecutive rows
+# with minBandPixels foreground pixels each, whose column profile has a run of at least minBandPixels occupied columns
+def findPlateBands(pixel_array, image_width, image_height, minBandPixels):
+    row_profile = computeRowProfile(pixel_array, image_width, image_height)
+    bands = []
+    start = None
+    for y in range(image_height + 1):
+        dense = y < image_height and row_profile[y] >= minBandPixels
+        if dense and start is None:
+            start = y
+        elif not dense and start is not None:
+            if y - start >= MIN_BAND_HEIGHT and computeLongestRun(computeColumnProfile(pixel_array, start, y)) >= minBandPixels:
+                bands.append((start, y))
+            start = None
+    return bands
+
+# Labels the components of a binary image like computeConnectedComponentLabeling, but only starts a component from
+# a pixel inside one of the bands. The flood fill of a component still follows it outside its band, so every labelled
+# component is complete, components that don't touch a band keep the value -1. Returns the labelled image
+# (pixel_array, modified in place) and the list of component sizes.
+def computeConnectedComponentLabelingInBands(pixel_array, image_width, image_height, bands, colourConnectedComponents):
+    for y in range(image_height):
+        pixel_array[y][:] = [-1 if value != 0 else 0 for value in pixel_array[y]]
+
+    labels = [0]
+    labelCount = 0
+    for start, end in bands:
+        for y in range(start, end):
+            row = pixel_array[y]
+            # the pixels left of a new component are labelled already, the search goes on from it
+            x = 0
+            while True:
+                try:
+                    x = row.index(-1, x)
+                except ValueError:
+                    break
+                labelCount += 1
+                pixel_array, labelSize = colourConnectedComponents(pixel_array, image_width, image_height, labelCount, x, y)
+                labels.append(labelSize)
+    return pixel_array, labels
+
+# Runs the profile check on the closed image and labels it, returns the labelled image and the component sizes.
+# A frame without any plate like band returns an empty labelled image and no components at all. minBandPixels 0
+# switches the check off and labels the whole image with labelingFunction. statistics, if given, counts the
+# outcome, see newProfileStatistics.
+def computeProfileCheckedLabeling(pixel_array, image_width, image_height, minBandPixels, labelingFunction, colourConnectedComponents, statistics=None):
+    if minBandPixels <= 0:
+        return labelingFunction(pixel_array, image_width, image_height)
+
+    bands = findPlateBands(pixel_array, image_width, image_height, minBandPixels)
+    recordProfileCheck(statistics, image_width, image_height, bands)
+    if bands == []:
+        return [[0] * image_width for y in range(image_height)], [0]
+    return computeConnectedComponentLabelingInBands(pixel_array, image_width, image_height, bands, colourConnectedComponents)
@@ -0,0 +1,128 @@
+import argparse
+import time
+
+import CS373LicensePlateDetection as detection
+import plateCandidates
+
+# number of components found at low resolution that are re-examined at full resolution,
+# the full resolution path looks at the largest component and up to 3 fallbacks
+DEFAULT_ROI_COUNT = 4
+
+# extra border around an upscaled region, in low resolution pixels and as a fraction of the region size
+ROI_MARGIN_PIXELS = 4
+ROI_MARGIN_FRACTION = 0.25
+
+# Halves the size of a pixel array by averaging 2x2 blocks, an odd last row or column is dropped
+def computeDownsampled2x2(pixel_array, image_width, image_height):
+    new_width = image_width // 2
+    new_height = image_height // 2
+    downsampled = []
+    for y in range(new_height):
+        row_a = pixel_array[2 * y]
+        row_b = pixel_array[2 * y + 1]
+        downsampled.append([(row_a[2 * x] + row_a[2 * x + 1] + row_b[2 * x] + row_b[2 * x + 1] + 2) // 4
+                            for x in range(new_width)])
+    return downsampled, new_width, new_height
+
+# Copies the region min_x..max_x, min_y..max_y (inclusive) out of a pixel array
+def cropPixelArray(pixel_array, min_x, max_x, min_y, max_y):
+    return [pixel_array[y][min_x:max_x + 1] for y in range(min_y, max_y + 1)]
+
+# Scales a low resolution bounding box up by scale and grows it by the ROI margin, clipped to the image
+def upscaleBoundingBox(bbox, scale, image_width, image_height):
+    min_x, max_x, min_y, max_y = bbox
+    margin_x = ROI_MARGIN_PIXELS + ROI_MARGIN_FRACTION * (max_x - min_x + 1)
+    margin_y = ROI_MARGIN_PIXELS + ROI_MARGIN_FRACTION * (max_y - min_y + 1)
+    return (max(0, int((min_x - margin_x) * scale)),
+            min(image_width - 1, int((max_x + 1 + margin_x) * scale)),
+            max(0, int((min_y - margin_y) * scale)),
+            min(image_height - 1, int((max_y + 1 + margin_y) * scale)))
+
+# Runs the std-dev, threshold, morphology and labeling stages on an already contrast enhanced greyscale
+# image and returns the component statistics and component sizes. An adaptive threshold is resolved from the
+# standard deviation histogram of this image, so each region gets its own.
+def computeStretchedComponents(px_array, image_width, image_height, closingIterations, thresholdValue = 150):
+    px_array = detection.computeStandardDeviationImage5x5(px_array, image_width, image_height)
+    px_array = detection.scaleTo0And255AndQuantize(px_array, image_width, image_height)
+    px_array = detection.computeAdaptiveThresholdGE(px_array, thresholdValue, image_width, image_height)
+    px_array = detection.computeClosing8Nbh3x3FlatSE(px_array, image_width, image_height, closingIterations)
+    connectedComponents_array, connectedComponents_labels = detection.computeConnectedComponentLabeling(px_array, image_width, image_height)
+    stats = plateCandidates.computeComponentStatistics(connectedComponents_array, len(connectedComponents_labels) - 1, image_width, image_height)
+    return stats, connectedComponents_labels
+
+# Coarse to fine detection: the greyscale image is downsampled levels times, the pipeline runs at low resolution
+# to find the largest components, and the std-dev/threshold/morphology/bbox stages are re-run at full resolution
+# only inside the upscaled regions around them. Returns the bounding box as min_x, max_x, min_y, max_y.
+# With levels = 0 this is the normal full resolution detection. thresholdValue and contrast as for detectLicensePlate.
+def detectLicensePlatePyramid(px_array_r, px_array_g, px_array_b, image_width, image_height, levels = 2, roiCount = DEFAULT_ROI_COUNT,
+                              thresholdValue = 150, contrast = "stretch"):
+    if levels == 0:
+        return detection.detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height, thresholdValue, contrast=contrast)
+
+    px_array = detection.computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
+
+    # the greyscale enhancement is global and cheap, so it is done once at full resolution and shared by all regions
+    px_array = detection.computeContrastEnhancedImage(px_array, image_width, image_height, contrast)
+
+    low_array, low_width, low_height = px_array, image_width, image_height
+    for level in range(levels):
+        low_array, low_width, low_height = computeDownsampled2x2(low_array, low_width, low_height)
+    scale = 2 ** levels
+
+    # the 4 closing iterations bridge gaps of a fixed size in full resolution pixels, which shrink with every level
+    low_stats, low_labels = computeStretchedComponents(low_array, low_width, low_height, max(1, 4 >> levels), thresholdValue)
+
+    # re-examine the largest low resolution components at full resolution, keeping the largest component of each region
+    regions = []
+    for label in plateCandidates.iterateLabelsBySize(low_labels):
+        if len(regions) == roiCount:
+            break
+        roi_min_x, roi_max_x, roi_min_y, roi_max_y = upscaleBoundingBox(
+            plateCandidates.statisticsBoundingBox(low_stats[label]), scale, image_width, image_height)
+        roi_width = roi_max_x - roi_min_x + 1
+        roi_height = roi_max_y - roi_min_y + 1
+        roi_array = cropPixelArray(px_array, roi_min_x, roi_max_x, roi_min_y, roi_max_y)
+        stats, labels = computeStretchedComponents(roi_array, roi_width, roi_height, 4, thresholdValue)
+        roiLabel = next(plateCandidates.iterateLabelsBySize(labels), None)
+        if roiLabel is None:
+            continue
+        min_x, max_x, min_y, max_y = plateCandidates.statisticsBoundingBox(stats[roiLabel])
+        regions.append((stats[roiLabel][plateCandidates.AREA],
+                        (min_x + roi_min_x, max_x + roi_min_x, min_y + roi_min_y, max_y + roi_min_y)))
+
+    if regions == []:
+        return image_width, 0, image_height, 0
+
+    # same selection as the full resolution path: the largest component unless one of the next ones has the expected ratio
+    regions.sort(key=lambda region: -region[0])
+    bbox = regions[0][1]
+    if not detection.boxHasExpectedRatio(*bbox):
+        for area, tempBox in regions[1:]:
+            if detection.boxHasExpectedRatio(*tempBox):
+                return tempBox
+    return bbox
+
+# Compares the pyramid detection against the full resolution path on a set of images
+def main():
+    parser = argparse.ArgumentParser(description="Compare pyramid detection against the full resolution detector")
+    parser.add_argument("images", nargs="*", default=["numberplate1.png", "numberplate2.png", "numberplate3.png",
+                                                      "numberplate4.png", "numberplate5.png", "numberplate6.png", "Test.png"])
+    parser.add_argument("--levels", default="1,2", help="comma separated pyramid levels to compare")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    for image in args.images:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detection.readRGBImageToSeparatePixelArrays(image)
+        start = time.perf_counter()
+        reference = detection.detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height)
+        reference_time = time.perf_counter() - start
+        print("{}: full resolution {} in {:.2f} s".format(image, reference, reference_time))
+        for level in levels:
+            start = time.perf_counter()
+            bbox = detectLicensePlatePyramid(px_array_r, px_array_g, px_array_b, image_width, image_height, level)
+            elapsed = time.perf_counter() - start
+            print("    levels={} {} in {:.2f} s ({:.1f}x), IoU {:.3f}".format(
+                level, bbox, elapsed, reference_time / elapsed, plateCandidates.computeBoundingBoxIoU(reference, bbox)))
+
+if __name__ == "__main__":
+    main()
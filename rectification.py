@@ -0,0 +1,129 @@
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+# import our basic, light-weight png reader library
+import imageIO.png
+
+import detectors
+
+# size of the upright plate crop handed to the OCR, roughly the 3:1 aspect of a plate with some margin
+DEFAULT_CROP_WIDTH = 240
+DEFAULT_CROP_HEIGHT = 80
+
+# weights of the greyscale conversion, the same as computeRGBToGreyscale
+GREY_WEIGHTS = (0.299, 0.587, 0.114)
+
+# Orders the 4 boundary points of a plate as top left, top right, bottom right, bottom left of the upright plate.
+# The points go around the plate clockwise (as returned by the detectors), rotation is the angle of the long side
+# in degrees, None for an axis aligned box.
+def orderPlateCorners(points, rotation):
+    angle = math.radians(rotation or 0.0)
+    cos_angle, sin_angle = math.cos(angle), math.sin(angle)
+    # undo the rotation, the top left corner then has the smallest x + y
+    upright = [(x * cos_angle + y * sin_angle, -x * sin_angle + y * cos_angle) for x, y in points]
+    first = min(range(4), key=lambda i: upright[i][0] + upright[i][1])
+    return [tuple(points[(first + i) % 4]) for i in range(4)]
+
+# Warps the plate region of an image into an upright crop_width x crop_height rectangle. The affine map takes the
+# top left, top right and bottom left corner onto the corners of the crop, every crop pixel is sampled bilinearly
+# from the input, so only the pixels under the plate are touched. Returns the crop as a bytes buffer, row by row,
+# one byte per pixel (greyscale) or three (rgb).
+def computePlateCrop(px_array_r, px_array_g, px_array_b, image_width, image_height, corners, crop_width=DEFAULT_CROP_WIDTH, crop_height=DEFAULT_CROP_HEIGHT, rgb=False):
+    top_left, top_right, bottom_right, bottom_left = corners
+    # source offset of one crop pixel step along x and along y
+    step_x = ((top_right[0] - top_left[0]) / max(crop_width - 1, 1), (top_right[1] - top_left[1]) / max(crop_width - 1, 1))
+    step_y = ((bottom_left[0] - top_left[0]) / max(crop_height - 1, 1), (bottom_left[1] - top_left[1]) / max(crop_height - 1, 1))
+    channels = (px_array_r, px_array_g, px_array_b) if rgb else None
+    max_x = image_width - 1
+    max_y = image_height - 1
+
+    crop = bytearray()
+    for v in range(crop_height):
+        x = top_left[0] + v * step_y[0]
+        y = top_left[1] + v * step_y[1]
+        for u in range(crop_width):
+            # clamp to the image so plates touching the border repeat their edge pixels
+            sx = min(max(x, 0.0), max_x)
+            sy = min(max(y, 0.0), max_y)
+            x0 = min(int(sx), max_x - 1) if max_x > 0 else 0
+            y0 = min(int(sy), max_y - 1) if max_y > 0 else 0
+            x1 = min(x0 + 1, max_x)
+            y1 = min(y0 + 1, max_y)
+            fx = sx - x0
+            fy = sy - y0
+            w00 = (1 - fx) * (1 - fy)
+            w10 = fx * (1 - fy)
+            w01 = (1 - fx) * fy
+            w11 = fx * fy
+            if rgb:
+                for channel in channels:
+                    value = channel[y0][x0] * w00 + channel[y0][x1] * w10 + channel[y1][x0] * w01 + channel[y1][x1] * w11
+                    crop.append(int(round(value)))
+            else:
+                value = 0.0
+                for channel, weight in zip((px_array_r, px_array_g, px_array_b), GREY_WEIGHTS):
+                    value += weight * (channel[y0][x0] * w00 + channel[y0][x1] * w10 + channel[y1][x0] * w01 + channel[y1][x1] * w11)
+                crop.append(min(int(round(value)), 255))
+            x += step_x[0]
+            y += step_x[1]
+    return bytes(crop)
+
+# Writes a crop buffer of computePlateCrop into a png file
+def writePlateCrop(crop, crop_width, crop_height, output_filename, rgb=False):
+    row_length = crop_width * (3 if rgb else 1)
+    rows = [crop[y * row_length:(y + 1) * row_length] for y in range(crop_height)]
+    writer = imageIO.png.Writer(crop_width, crop_height, greyscale=not rgb)
+    with open(output_filename, "wb") as output_file:
+        writer.write(output_file, rows)
+
+# Runs a detector variant on r, g, b pixel arrays and returns its json result together with the upright plate crop
+def detectPlateCrop(variant, px_array_r, px_array_g, px_array_b, image_width, image_height, parameters=None, crop_width=DEFAULT_CROP_WIDTH, crop_height=DEFAULT_CROP_HEIGHT, rgb=False):
+    result = detectors.runDetection(variant, px_array_r, px_array_g, px_array_b, image_width, image_height, parameters)
+    min_x, max_x, min_y, max_y = result["bbox"]
+    if min_x > max_x or min_y > max_y:
+        return result, None
+    points = result.get("points", [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]])
+    corners = orderPlateCorners(points, result.get("rotation"))
+    crop = computePlateCrop(px_array_r, px_array_g, px_array_b, image_width, image_height, corners, crop_width, crop_height, rgb)
+    return result, crop
+
+# Detects the plate of every image and writes its upright crop into the output directory as <name>_plate.png,
+# prints one json line per image
+def main():
+    parser = argparse.ArgumentParser(description="Write upright, fixed size crops of the detected plates")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--variant", default="extension", choices=sorted(detectors.VARIANTS))
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a detector parameter")
+    parser.add_argument("--size", default="{}x{}".format(DEFAULT_CROP_WIDTH, DEFAULT_CROP_HEIGHT), help="crop size WIDTHxHEIGHT")
+    parser.add_argument("--rgb", action="store_true", help="keep the colour channels instead of a greyscale crop")
+    parser.add_argument("--output-dir", default="output_images")
+    args = parser.parse_args()
+
+    try:
+        parameters = detectors.parseParameters(args.variant, args.set)
+        crop_width, crop_height = [int(value) for value in args.size.lower().split("x")]
+    except ValueError as error:
+        parser.error(str(error))
+    output_path = Path(args.output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    for image in args.images:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(image)
+        start = time.perf_counter()
+        result, crop = detectPlateCrop(args.variant, px_array_r, px_array_g, px_array_b, image_width, image_height,
+                                       parameters, crop_width, crop_height, args.rgb)
+        result["image"] = image
+        result["milliseconds"] = round((time.perf_counter() - start) * 1000, 1)
+        if crop is not None:
+            output_filename = output_path / (Path(image).stem + "_plate.png")
+            writePlateCrop(crop, crop_width, crop_height, output_filename, args.rgb)
+            result["crop"] = str(output_filename)
+        print(json.dumps(result))
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
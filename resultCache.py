@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import detectors
+
+# bump this whenever a change to the pipeline changes detections, old entries then simply stop matching
+CACHE_FORMAT_VERSION = 2
+
+DEFAULT_CACHE_DIRECTORY = ".detection_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# eviction frees the cache down to this share of max_bytes, so a full cache isn't scanned again on every write
+EVICTION_TARGET = 0.9
+
+# Hash of the png file bytes, identifies the input independent of its file name
+def computeContentHash(file_bytes):
+    return hashlib.sha256(file_bytes).hexdigest()
+
+# Cache key of a final detection: the input content plus everything that changes the result
+def computeCacheKey(content_hash, variant, parameters):
+    settings = json.dumps({"version": CACHE_FORMAT_VERSION, "variant": variant, "parameters": parameters}, sort_keys=True)
+    return hashlib.sha256((content_hash + settings).encode()).hexdigest()
+
+# Persistent content addressed cache of detections in a directory, optionally with the stretched standard deviation
+# image of each input. Entries are evicted least recently used first once the directory grows past max_bytes,
+# a hit updates the modification time of the entry so the file times double as the LRU order.
+# The size of the directory is scanned once and then kept as a running total of the writes, the directory is only
+# scanned again when that total passes max_bytes. Entries written by other processes are counted at that scan.
+class ResultCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.total_bytes = None
+        self.lock = threading.Lock()
+
+    def entryPath(self, key, suffix):
+        return self.directory / key[:2] / (key + suffix)
+
+    # returns the stored bytes of an entry and marks it as recently used, None on a miss
+    def read(self, key, suffix):
+        path = self.entryPath(key, suffix)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    # writes an entry atomically so concurrent readers never see half written files, the temporary file is private
+    # to the writing thread
+    def write(self, key, suffix, data):
+        path = self.entryPath(key, suffix)
+        path.parent.mkdir(exist_ok=True)
+        temporary = path.with_name(path.name + ".{}-{}.tmp".format(os.getpid(), threading.get_ident()))
+        temporary.write_bytes(data)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(temporary, path)
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self.scanEntries()[1]
+            else:
+                self.total_bytes += len(data) - replaced
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def getDetection(self, key):
+        data = self.read(key, ".json")
+        return None if data is None else json.loads(data)
+
+    def putDetection(self, key, result):
+        self.write(key, ".json", json.dumps(result).encode())
+
+    # the stretched standard deviation image of an input and a contrast enhancement, stored as zlib compressed bytes
+    # with a size header
+    def getStandardDeviationImage(self, content_hash, contrast="stretch"):
+        data = self.read(content_hash + "-stddev-{}-{}".format(contrast, CACHE_FORMAT_VERSION), ".bin")
+        if data is None:
+            return None
+        image_width = int.from_bytes(data[0:4], "big")
+        image_height = int.from_bytes(data[4:8], "big")
+        pixels = zlib.decompress(data[8:])
+        return [list(pixels[y * image_width:(y + 1) * image_width]) for y in range(image_height)]
+
+    def putStandardDeviationImage(self, content_hash, std_dev_array, image_width, image_height, contrast="stretch"):
+        pixels = b"".join(bytes(row) for row in std_dev_array)
+        data = image_width.to_bytes(4, "big") + image_height.to_bytes(4, "big") + zlib.compress(pixels)
+        self.write(content_hash + "-stddev-{}-{}".format(contrast, CACHE_FORMAT_VERSION), ".bin", data)
+
+    # returns the entries as (modification time, size, path) and their total size
+    def scanEntries(self):
+        entries = []
+        total = 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return entries, total
+
+    # removes the least recently used entries until the cache fits into EVICTION_TARGET of max_bytes once it has
+    # grown past max_bytes, and resets the running total
+    def evict(self):
+        entries, total = self.scanEntries()
+        self.total_bytes = total
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes * EVICTION_TARGET:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total_bytes = total
+
+# Returns the detection for a png file, from the cache if the same bytes were already processed with the same
+# variant and parameters. With cacheStages the stretched standard deviation image is cached as well, so a run with
+# other parameters on the same input only repeats the stages after it. The result gets a "cached" flag.
+def detectFile(filename, variant, parameters, cache, cacheStages=False):
+    file_bytes = Path(filename).read_bytes()
+    content_hash = computeContentHash(file_bytes)
+    key = computeCacheKey(content_hash, variant, parameters)
+
+    result = cache.getDetection(key)
+    if result is not None:
+        result["cached"] = True
+        return result
+
+    contrast = parameters.get("contrast", "stretch")
+    std_dev_array = cache.getStandardDeviationImage(content_hash, contrast) if cacheStages else None
+    if std_dev_array is not None:
+        image_width, image_height = len(std_dev_array[0]), len(std_dev_array)
+    else:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageBytes(file_bytes)
+        std_dev_array = detectors.computeStandardDeviationImage(px_array_r, px_array_g, px_array_b, image_width, image_height, contrast)
+        if cacheStages:
+            cache.putStandardDeviationImage(content_hash, std_dev_array, image_width, image_height, contrast)
+
+    result = detectors.runDetectionFromStandardDeviationImage(variant, std_dev_array, image_width, image_height, parameters)
+    cache.putDetection(key, result)
+    result["cached"] = False
+    return result
+
+# Detects the plates of a list of images through the cache and prints one json line per image
+def main():
+    parser = argparse.ArgumentParser(description="Run a detector through the persistent result cache")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--variant", default="detection", choices=sorted(detectors.VARIANTS))
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a detector parameter, e.g. thresholdValue=otsu or closingIterations=3")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIRECTORY)
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024), help="cache size limit")
+    parser.add_argument("--cache-stages", action="store_true",
+                        help="also cache the standard deviation image so parameter changes skip the upstream stages")
+    args = parser.parse_args()
+
+    try:
+        parameters = detectors.parseParameters(args.variant, args.set)
+    except ValueError as error:
+        parser.error(str(error))
+    cache = ResultCache(args.cache_dir, int(args.max_mb * 1024 * 1024))
+    for image in args.images:
+        start = time.perf_counter()
+        result = detectFile(image, args.variant, parameters, cache, args.cache_stages)
+        result["image"] = image
+        result["milliseconds"] = round((time.perf_counter() - start) * 1000, 1)
+        print(json.dumps(result))
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Per stage timing of the detectors, shared by the benchmark and the batch runner: the stage functions of a detector
+# module are replaced by wrappers that add up their run time while a StageTimer is active.
+
+import time
+
+# pipeline functions that are timed as separate stages, a stage that is called several times
+# (e.g. the 4 dilations) is reported as the sum of all its calls in one run.
+# Dotted names refer to functions of a module the detector imports. With a fixed threshold the standard deviation,
+# its stretch and the threshold run fused as varianceThreshold.computeVarianceThresholdGE, the separate
+# computeStandardDeviationImage5x5 and computeThresholdGE stages only show up for adaptive thresholds.
+STAGE_FUNCTIONS = ["computeRGBToGreyscale", "scaleTo0And255AndQuantize", "computeStandardDeviationImage5x5",
+                   "computeThresholdGE", "computeDilation8Nbh3x3FlatSE", "computeErosion8Nbh3x3FlatSE",
+                   "computeConnectedComponentLabeling", "computeBoundaryBoxBounds",
+                   "computeBoundaryBoxBoundsClockwise", "computeBoundaryBoxBoundsCounterclockwise", "computeComponentRowExtents",
+                   "plateCandidates.computeComponentStatistics", "projectionProfile.computeProfileCheckedLabeling",
+                   "varianceThreshold.computeVarianceThresholdGE"]
+
+# Replaces the stage functions of a detector module with wrappers that add their run time to stage_times.
+# on_stage, if given, is called with the stage name and the stage times so far whenever a stage starts.
+class StageTimer:
+    def __init__(self, module, on_stage=None):
+        self.module = module
+        self.on_stage = on_stage
+        self.stage_times = {}
+        self.originals = {}
+
+    # returns the module that holds a stage function and the function name, None if the detector doesn't use it
+    def resolve(self, name):
+        owner = self.module
+        *path, function_name = name.split(".")
+        for attribute in path:
+            owner = getattr(owner, attribute, None)
+        if owner is None or not hasattr(owner, function_name):
+            return None
+        return owner, function_name
+
+    def __enter__(self):
+        for name in STAGE_FUNCTIONS:
+            resolved = self.resolve(name)
+            if resolved is not None:
+                owner, function_name = resolved
+                self.originals[name] = (owner, function_name, getattr(owner, function_name))
+                setattr(owner, function_name, self.wrap(name, getattr(owner, function_name)))
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, function_name, function in self.originals.values():
+            setattr(owner, function_name, function)
+        self.originals = {}
+
+    def wrap(self, name, function):
+        def timed(*args, **kwargs):
+            if self.on_stage is not None:
+                self.on_stage(name, self.stage_times)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.stage_times[name] = self.stage_times.get(name, 0.0) + time.perf_counter() - start
+        return timed
+
+    def reset(self):
+        self.stage_times = {}
@@ -0,0 +1,323 @@
+# Row streaming detection for images too large to hold as full pixel arrays.
+# The detectors keep the r, g, b channels, the greyscale image, the standard deviation image and every morphology
+# intermediate as list of lists images, several times the size of the frame. Here the rows flow from the png reader
+# through every stage instead: the greyscale conversion and the contrast lookup work per row, the fused standard
+# deviation threshold of varianceThreshold holds 5 rows, every dilation and erosion 3 rows, and the labeling only
+# the runs of the previous row plus a union-find over the components that are still open. The stages that need the
+# whole image (the greyscale histogram for the stretch, the standard deviation range) get a pass of their own, so
+# the png is decoded three times and peak memory grows with the width, not with the height.
+
+import argparse
+import itertools
+import time
+import tracemalloc
+
+# import our basic, light-weight png reader library
+import imageIO.png
+
+import CS373LicensePlateDetection as detection
+import adaptiveThreshold
+import equalization
+import histogram
+import plateCandidates
+import projectionProfile
+import varianceThreshold
+
+# contrast enhancements that work on a row stream, CLAHE needs the tile histograms of the whole image
+STREAMING_CONTRAST_METHODS = ["stretch", "equalize"]
+
+# Opens a png for row streaming and returns width, height and an iterator over its rows as greyscale values,
+# computed like computeRGBToGreyscale. make_reader returns a fresh imageIO.png.Reader.
+def readGreyscaleRows(make_reader):
+    (image_width, image_height, rows, info) = make_reader().read()
+    if "palette" in info or info["bitdepth"] != 8:
+        (image_width, image_height, rows, info) = make_reader().asRGBA8()
+    planes = info["planes"]
+
+    def greyscaleRows():
+        for row in rows:
+            if planes < 3:
+                yield [int(round(0.299*value + 0.587*value + 0.114*value)) for value in row[0::planes]]
+            else:
+                yield [int(round(0.299*r + 0.587*g + 0.114*b)) for r, g, b in zip(row[0::planes], row[1::planes], row[2::planes])]
+
+    return image_width, image_height, greyscaleRows()
+
+# Lookup table of the contrast enhancement from the 256 greyscale value counts: the min/max stretch of
+# scaleTo0And255AndQuantize or the histogram equalization
+def computeContrastLUT(value_counts, contrast = "stretch"):
+    if contrast == "equalize":
+        return equalization.computeEqualizationLUT(value_counts)
+    if contrast != "stretch":
+        raise ValueError("contrast {} can't be streamed, expected one of {}".format(contrast, ", ".join(STREAMING_CONTRAST_METHODS)))
+    occupied = [value for value in range(256) if value_counts[value] > 0]
+    smallest = occupied[0]
+    largest = occupied[-1]
+    if largest == smallest:
+        return [0] * 256
+    m = 255/(largest - smallest)
+    return [max(0, round((value - smallest) * m)) for value in range(256)]
+
+# Yields every row together with the row above and below it, None outside the image
+def iterateRowNeighbourhoods(rows, image_height):
+    rows = iter(rows)
+    previous = None
+    current = next(rows, None)
+    for y in range(image_height):
+        following = next(rows) if y + 1 < image_height else None
+        yield previous, current, following
+        previous, current = current, following
+
+# Streaming computeDilation8Nbh3x3FlatSE: a pixel is 1 if any pixel of its 3x3 neighbourhood inside the image is set
+def iterateDilatedRows(rows, image_width, image_height):
+    empty = [0] * image_width
+    for previous, current, following in iterateRowNeighbourhoods(rows, image_height):
+        vertical = [0] + [1 if a or b or c else 0 for a, b, c in zip(previous or empty, current, following or empty)] + [0]
+        yield [1 if a or b or c else 0 for a, b, c in zip(vertical, vertical[1:], vertical[2:])]
+
+# Streaming computeErosion8Nbh3x3FlatSE: a pixel is 1 if its whole 3x3 neighbourhood is set, border pixels are 0
+def iterateErodedRows(rows, image_width, image_height):
+    empty = [0] * image_width
+    for previous, current, following in iterateRowNeighbourhoods(rows, image_height):
+        if previous is None or following is None or image_width < 3:
+            yield list(empty)
+            continue
+        vertical = [1 if a and b and c else 0 for a, b, c in zip(previous, current, following)]
+        yield [0] + [1 if a and b and c else 0 for a, b, c in zip(vertical, vertical[1:], vertical[2:])] + [0]
+
+# Streaming computeClosing8Nbh3x3FlatSE, each iteration delays the output by one row
+def iterateClosedRows(rows, image_width, image_height, iterations = 4):
+    for i in range(iterations):
+        rows = iterateDilatedRows(rows, image_width, image_height)
+    for i in range(iterations):
+        rows = iterateErodedRows(rows, image_width, image_height)
+    return rows
+
+# Streaming projectionProfile.findPlateBands: the row profile is counted as the rows pass and the occupied columns
+# of the band that is currently open are collected, so a band is checked as soon as it ends
+class StreamingBandFinder:
+    def __init__(self, image_width, minBandPixels):
+        self.image_width = image_width
+        self.minBandPixels = minBandPixels
+        self.bands = []
+        self.start = None
+        self.occupied = None
+        self.rows = 0
+
+    def addRow(self, row):
+        y = self.rows
+        self.rows += 1
+        if self.image_width - row.count(0) >= self.minBandPixels:
+            if self.start is None:
+                self.start = y
+                self.occupied = [0] * self.image_width
+            self.occupied = [1 if a or b else 0 for a, b in zip(self.occupied, row)]
+        else:
+            self.closeBand(y)
+
+    def closeBand(self, end):
+        if self.start is not None:
+            if end - self.start >= projectionProfile.MIN_BAND_HEIGHT and projectionProfile.computeLongestRun(self.occupied) >= self.minBandPixels:
+                self.bands.append((self.start, end))
+            self.start = None
+            self.occupied = None
+
+    def finish(self):
+        self.closeBand(self.rows)
+        return self.bands
+
+# Row incremental connected component labeling with 4-connectivity like computeConnectedComponentLabeling.
+# Every row is split into runs of foreground pixels, a run joins the components of the runs it overlaps in the
+# previous row through a union-find, and a component that no run of the current row continues is finished.
+# Only the runs of the previous row and the open components are held. Every component keeps the statistics of
+# plateCandidates.computeComponentStatistics and its first pixel in raster order.
+class StreamingComponentLabeling:
+    def __init__(self, image_width):
+        self.image_width = image_width
+        self.parent = {}
+        self.open = {}
+        self.finished = []
+        self.previous_runs = []
+        self.next_label = 1
+        self.rows = 0
+
+    def find(self, label):
+        root = label
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[label] != root:
+            self.parent[label], label = root, self.parent[label]
+        return root
+
+    # merges two components, the one whose first pixel comes first stays the root
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return a
+        entry_a = self.open[a]
+        entry_b = self.open[b]
+        if entry_b[1] < entry_a[1]:
+            a, b, entry_a, entry_b = b, a, entry_b, entry_a
+        stats_a, stats_b = entry_a[0], entry_b[0]
+        stats_a[plateCandidates.AREA] += stats_b[plateCandidates.AREA]
+        stats_a[plateCandidates.MIN_X] = min(stats_a[plateCandidates.MIN_X], stats_b[plateCandidates.MIN_X])
+        stats_a[plateCandidates.MAX_X] = max(stats_a[plateCandidates.MAX_X], stats_b[plateCandidates.MAX_X])
+        stats_a[plateCandidates.MIN_Y] = min(stats_a[plateCandidates.MIN_Y], stats_b[plateCandidates.MIN_Y])
+        stats_a[plateCandidates.MAX_Y] = max(stats_a[plateCandidates.MAX_Y], stats_b[plateCandidates.MAX_Y])
+        self.parent[b] = a
+        del self.open[b]
+        return a
+
+    def addRow(self, row):
+        y = self.rows
+        self.rows += 1
+        runs = []
+        x = 0
+        for value, group in itertools.groupby(row, bool):
+            length = len(list(group))
+            if value:
+                runs.append([x, x + length, None])
+            x += length
+
+        # runs overlapping in at least one column belong to the same component, both run lists are sorted
+        previous_runs = self.previous_runs
+        i = 0
+        for run in runs:
+            start, end = run[0], run[1]
+            while i < len(previous_runs) and previous_runs[i][1] <= start:
+                i += 1
+            j = i
+            while j < len(previous_runs) and previous_runs[j][0] < end:
+                run[2] = previous_runs[j][2] if run[2] is None else self.union(run[2], previous_runs[j][2])
+                j += 1
+            if run[2] is None:
+                label = self.next_label
+                self.next_label += 1
+                self.parent[label] = label
+                self.open[label] = [[0, start, end - 1, y, y, 0], (y, start)]
+                run[2] = label
+            stats = self.open[self.find(run[2])][0]
+            stats[plateCandidates.AREA] += end - start
+            stats[plateCandidates.MIN_X] = min(stats[plateCandidates.MIN_X], start)
+            stats[plateCandidates.MAX_X] = max(stats[plateCandidates.MAX_X], end - 1)
+            stats[plateCandidates.MAX_Y] = y
+
+        # components not continued by this row are finished, the union-find only keeps the open ones
+        for run in runs:
+            run[2] = self.find(run[2])
+        active = set(run[2] for run in runs)
+        for label in list(self.open):
+            if label not in active:
+                self.finished.append(self.open.pop(label))
+        self.parent = {label: label for label in active}
+        self.previous_runs = runs
+
+    # Returns the component statistics and sizes like computeComponentStatistics and computeConnectedComponentLabeling,
+    # components are labelled in the order of their first pixel, as the flood fill labels them.
+    # With bands only the components that reach into one of the bands are returned.
+    def finish(self, bands = None):
+        components = self.finished + list(self.open.values())
+        self.finished = []
+        self.open = {}
+        if bands is not None:
+            components = [entry for entry in components
+                          if any(entry[0][plateCandidates.MIN_Y] < end and start <= entry[0][plateCandidates.MAX_Y] for start, end in bands)]
+        components.sort(key=lambda entry: entry[1])
+        stats = [[0, self.image_width, 0, self.rows, 0, 0]] + [entry[0] for entry in components]
+        labels = [0] + [entry[0][plateCandidates.AREA] for entry in components]
+        return stats, labels
+
+# Runs the detection of CS373LicensePlateDetection row by row on a png and returns the plate bounding box as
+# min_x, max_x, min_y, max_y, (width, 0, height, 0) if there is no plate. statistics as for
+# projectionProfile.computeProfileCheckedLabeling.
+# make_reader returns a fresh imageIO.png.Reader, the png is read three times: for the greyscale histogram,
+# for the standard deviation range and for the threshold, morphology and labeling.
+def detectLicensePlateStreaming(make_reader, thresholdValue = 150, closingIterations = 4, ratioMin = 2, ratioMax = 5, contrast = "stretch", minBandPixels = 20, statistics = None):
+    if adaptiveThreshold.isAdaptiveThreshold(thresholdValue):
+        raise ValueError("adaptive thresholds need the whole standard deviation image, use a fixed threshold")
+
+    # pass 1: greyscale histogram for the contrast stretch or equalization
+    image_width, image_height, rows = readGreyscaleRows(make_reader)
+    greyscale_histogram = histogram.StreamingHistogram()
+    for row in rows:
+        greyscale_histogram.addRow(row)
+    lut = computeContrastLUT(greyscale_histogram.counts, contrast)
+
+    def enhancedRows():
+        return (list(map(lut.__getitem__, row)) for row in readGreyscaleRows(make_reader)[2])
+
+    # pass 2: range of the standard deviation for its stretch
+    smallest, largest = varianceThreshold.computeStretchRange(enhancedRows(), image_width, image_height)
+    cutoff = varianceThreshold.computeVarianceCutoff(smallest, largest, thresholdValue)
+
+    # pass 3: threshold, closing, profile check and labeling
+    edge_rows = varianceThreshold.iterateVarianceThresholdRows(enhancedRows(), image_width, image_height, cutoff)
+    labeling = StreamingComponentLabeling(image_width)
+    band_finder = StreamingBandFinder(image_width, minBandPixels) if minBandPixels > 0 else None
+    for row in iterateClosedRows(edge_rows, image_width, image_height, closingIterations):
+        labeling.addRow(row)
+        if band_finder is not None:
+            band_finder.addRow(row)
+
+    bands = None
+    if band_finder is not None:
+        bands = band_finder.finish()
+        projectionProfile.recordProfileCheck(statistics, image_width, image_height, bands)
+        if bands == []:
+            # no plate like band, the components labelled along the way are dropped without picking a plate
+            return image_width, 0, image_height, 0
+    stats, labels = labeling.finish(bands)
+    if len(labels) == 1:
+        return image_width, 0, image_height, 0
+    return detection.selectPlateBoundingBox(stats, labels, ratioMin, ratioMax)
+
+# Runs function and returns its result, the seconds it took and the peak of the memory traced meanwhile in bytes
+def measure(function, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+# Detects the plate in every image row by row, optionally compared with the detection on full pixel arrays
+def main():
+    parser = argparse.ArgumentParser(description="Detect plates row by row with memory bounded by the image width")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a detection parameter")
+    parser.add_argument("--compare", action="store_true", help="also run the detection on full pixel arrays")
+    parser.add_argument("--memory", action="store_true", help="report the peak traced memory (slows both runs down)")
+    args = parser.parse_args()
+
+    # imported here so that the streaming path itself never touches the full image reader
+    import detectors
+    try:
+        parameters = detectors.parseParameters("detection", args.set)
+    except ValueError as error:
+        parser.error(str(error))
+
+    for image in args.images:
+        make_reader = lambda: imageIO.png.Reader(filename=image)
+        bbox, seconds, peak = measure(lambda: detectLicensePlateStreaming(make_reader, **parameters), args.memory)
+        line = "{:<18} streaming {} {:>8.0f} ms".format(image, list(bbox), seconds * 1000)
+        if peak is not None:
+            line += " {:>8.1f} MB".format(peak / 1e6)
+        if args.compare:
+            def fullDetection():
+                (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(image)
+                return detection.detectLicensePlate(px_array_r, px_array_g, px_array_b, image_width, image_height, **parameters)
+            full_bbox, full_seconds, full_peak = measure(fullDetection, args.memory)
+            line += "  full {} {:>8.0f} ms".format(list(full_bbox), full_seconds * 1000)
+            if full_peak is not None:
+                line += " {:>8.1f} MB".format(full_peak / 1e6)
+            if tuple(full_bbox) != tuple(bbox):
+                line += "  MISMATCH"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import csv
+import itertools
+import statistics
+import sys
+import time
+from multiprocessing import Pool
+
+import adaptiveThreshold
+import detectors
+import pipelineGraph
+import plateCandidates
+
+BUNDLED_IMAGES = ["numberplate1.png", "numberplate2.png", "numberplate3.png", "numberplate4.png",
+                  "numberplate5.png", "numberplate6.png", "Test.png"]
+
+# parameters in pipeline order, the grid is walked with the upstream parameters changing slowest so that
+# consecutive configurations share as many memoized stages as possible
+PARAMETER_ORDER = ["contrast", "thresholdValue", "closingIterations", "minBandPixels", "ratioMin", "ratioMax", "angleVariance", "boxFitting"]
+
+# Parses NAME=V1,V2,... grid options into an ordered list of (name, values)
+def parseGrid(options):
+    grid = {}
+    for option in options:
+        name, values = option.split("=", 1)
+        if name not in PARAMETER_ORDER:
+            raise ValueError("unknown parameter {}, expected one of {}".format(name, ", ".join(PARAMETER_ORDER)))
+        if name == "thresholdValue":
+            grid[name] = [adaptiveThreshold.parseThreshold(value) for value in values.split(",")]
+        elif name in ("closingIterations", "minBandPixels"):
+            grid[name] = [int(value) for value in values.split(",")]
+        elif name in ("contrast", "boxFitting"):
+            grid[name] = values.split(",")
+        else:
+            grid[name] = [float(value) for value in values.split(",")]
+    return [(name, grid[name]) for name in PARAMETER_ORDER if name in grid]
+
+# All configurations of the grid for a variant, parameters a variant doesn't have are left out
+def expandGrid(grid, variant):
+    defaults = detectors.defaultParameters(variant)
+    names = [name for name, values in grid if name in defaults]
+    value_lists = [values for name, values in grid if name in defaults]
+    configurations = []
+    for values in itertools.product(*value_lists):
+        configurations.append(dict(zip(names, values)))
+    return configurations
+
+# Worker: decodes one image and evaluates every configuration of every variant on it through one pipeline graph.
+# Returns one row per configuration with the detection, its agreement with the default configuration and timings.
+def sweepImage(task):
+    image, variants, grid, memory_bytes = task
+    graph = pipelineGraph.PipelineGraph(memory_bytes)
+    (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(image)
+    graph.addImage(image, px_array_r, px_array_g, px_array_b, image_width, image_height)
+
+    rows = []
+    for variant in variants:
+        reference = graph.detect(image, variant)
+        for configuration in expandGrid(grid, variant):
+            start = time.perf_counter()
+            result = graph.detect(image, variant, configuration)
+            incremental = time.perf_counter() - start
+            rows.append({"image": image, "variant": variant, "configuration": configuration,
+                         "bbox": result["bbox"], "rotation": result.get("rotation"),
+                         "iou_vs_default": plateCandidates.computeBoundingBoxIoU(reference["bbox"], result["bbox"]),
+                         "standalone_ms": graph.configurationSeconds(image, variant, configuration) * 1000,
+                         "incremental_ms": incremental * 1000})
+    graph.removeImage(image)
+    return rows
+
+def formatConfiguration(configuration):
+    return " ".join("{}={}".format(name, value) for name, value in configuration.items()) or "defaults"
+
+# Averages the rows of every configuration over the images
+def summarise(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["variant"], formatConfiguration(row["configuration"])), []).append(row)
+    summary = []
+    for (variant, configuration), group in groups.items():
+        summary.append({"variant": variant, "configuration": configuration, "images": len(group),
+                        "mean_iou_vs_default": statistics.mean(row["iou_vs_default"] for row in group),
+                        "mean_standalone_ms": statistics.mean(row["standalone_ms"] for row in group)})
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a grid of detector parameters over a set of images")
+    parser.add_argument("images", nargs="*", default=BUNDLED_IMAGES)
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2",
+                        help="values of one parameter, e.g. thresholdValue=130,150,otsu closingIterations=3,4")
+    parser.add_argument("--variants", default="detection", help="comma separated detectors to run")
+    parser.add_argument("--workers", type=int, default=None, help="parallel worker processes (default: all cpus)")
+    parser.add_argument("--memory-mb", type=float, default=pipelineGraph.DEFAULT_MEMORY_BUDGET / (1024 * 1024),
+                        help="memo budget of each worker")
+    parser.add_argument("--csv", help="also write the per image rows to this csv file")
+    args = parser.parse_args()
+
+    try:
+        grid = parseGrid(args.grid)
+    except ValueError as error:
+        parser.error(str(error))
+    variants = args.variants.split(",")
+    for variant in variants:
+        if variant not in detectors.VARIANTS:
+            parser.error("unknown variant {}".format(variant))
+
+    tasks = [(image, variants, grid, int(args.memory_mb * 1024 * 1024)) for image in args.images]
+    rows = []
+    with Pool(args.workers) as pool:
+        for image_rows in pool.imap_unordered(sweepImage, tasks):
+            rows.extend(image_rows)
+            print("done {}".format(image_rows[0]["image"] if image_rows else "?"), file=sys.stderr)
+    rows.sort(key=lambda row: (row["variant"], formatConfiguration(row["configuration"]), row["image"]))
+
+    print("{:<10} {:<60} {:<18} {:<24} {:>8} {:>12} {:>14}".format(
+        "variant", "configuration", "image", "bbox", "iou", "standalone", "incremental"))
+    for row in rows:
+        print("{:<10} {:<60} {:<18} {:<24} {:>8.3f} {:>9.0f} ms {:>11.0f} ms".format(
+            row["variant"], formatConfiguration(row["configuration"]), row["image"], str(row["bbox"]),
+            row["iou_vs_default"], row["standalone_ms"], row["incremental_ms"]))
+
+    print()
+    print("{:<10} {:<60} {:>8} {:>14}".format("variant", "configuration", "mean iou", "mean cost"))
+    for entry in summarise(rows):
+        print("{:<10} {:<60} {:>8.3f} {:>11.0f} ms".format(
+            entry["variant"], entry["configuration"], entry["mean_iou_vs_default"], entry["mean_standalone_ms"]))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["variant", "configuration", "image", "bbox", "rotation", "iou_vs_default",
+                             "standalone_ms", "incremental_ms"])
+            for row in rows:
+                writer.writerow([row["variant"], formatConfiguration(row["configuration"]), row["image"],
+                                 " ".join(str(value) for value in row["bbox"]), row["rotation"],
+                                 round(row["iou_vs_default"], 4), round(row["standalone_ms"], 1),
+                                 round(row["incremental_ms"], 1)])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import detectors
+import plateCandidates
+import pyramid
+
+# every REFRESH_INTERVAL frames the full frame is searched again even if the plate is still tracked
+DEFAULT_REFRESH_INTERVAL = 10
+
+# the region searched around the previous plate grows it by this fraction of its size plus a fixed border in pixels
+ROI_MARGIN_FRACTION = 0.5
+ROI_MARGIN_PIXELS = 16
+
+# a plate found inside the region is only accepted if its area is within this factor of the previous plate's area
+MAX_AREA_CHANGE = 2.0
+
+# Moves a json detection result by dx, dy, used to map a detection inside a region back into the frame
+def offsetResult(result, dx, dy):
+    moved = dict(result)
+    min_x, max_x, min_y, max_y = result["bbox"]
+    moved["bbox"] = [min_x + dx, max_x + dx, min_y + dy, max_y + dy]
+    if result.get("points"):
+        moved["points"] = [[x + dx, y + dy] for x, y in result["points"]]
+    return moved
+
+# True if a detection is a plate worth tracking: a non empty box with an aspect ratio between ratioMin and ratioMax,
+# the ratio window of the detector that found it
+def isConfidentDetection(result, ratioMin = plateCandidates.EXPECTED_RATIO_MIN, ratioMax = plateCandidates.EXPECTED_RATIO_MAX):
+    min_x, max_x, min_y, max_y = result["bbox"]
+    if min_x >= max_x or min_y >= max_y:
+        return False
+    ratio = (max_x - min_x) / (max_y - min_y)
+    return ratioMin <= ratio <= ratioMax
+
+# The search region around a bounding box, clipped to the frame, as min_x, max_x, min_y, max_y
+def expandBoundingBox(bbox, image_width, image_height):
+    min_x, max_x, min_y, max_y = bbox
+    margin_x = int(ROI_MARGIN_FRACTION * (max_x - min_x + 1)) + ROI_MARGIN_PIXELS
+    margin_y = int(ROI_MARGIN_FRACTION * (max_y - min_y + 1)) + ROI_MARGIN_PIXELS
+    return (max(0, min_x - margin_x), min(image_width - 1, max_x + margin_x),
+            max(0, min_y - margin_y), min(image_height - 1, max_y + margin_y))
+
+# Area of an inclusive bounding box
+def boundingBoxArea(bbox):
+    min_x, max_x, min_y, max_y = bbox
+    return max(0, max_x - min_x + 1) * max(0, max_y - min_y + 1)
+
+# Detects the plate in consecutive frames of a video. After a confident detection the following frames only search
+# an expanded region around the previous plate. The full frame is searched again when the region doesn't give
+# a confident plate of a similar size touching none of the region borders, and every refreshInterval frames.
+class PlateTracker:
+    def __init__(self, variant="detection", parameters=None, refreshInterval=DEFAULT_REFRESH_INTERVAL):
+        self.variant = variant
+        self.parameters = parameters if parameters is not None else detectors.defaultParameters(variant)
+        # a tracked plate must have the aspect ratio the detector itself accepts
+        ratio_parameters = dict(detectors.defaultParameters(variant), **self.parameters)
+        self.ratioMin = ratio_parameters["ratioMin"]
+        self.ratioMax = ratio_parameters["ratioMax"]
+        self.refreshInterval = refreshInterval
+        self.previous = None
+        self.frame = 0
+        self.frames_since_full = 0
+
+    def detectFull(self, px_array_r, px_array_g, px_array_b, image_width, image_height):
+        self.frames_since_full = 0
+        return detectors.runDetection(self.variant, px_array_r, px_array_g, px_array_b, image_width, image_height, self.parameters)
+
+    # runs the detector on the region around the previous plate, returns the result in frame coordinates
+    # or None if the region doesn't contain a plate that continues the track
+    def detectInRegion(self, px_array_r, px_array_g, px_array_b, image_width, image_height, roi):
+        roi_min_x, roi_max_x, roi_min_y, roi_max_y = roi
+        channels = [pyramid.cropPixelArray(channel, roi_min_x, roi_max_x, roi_min_y, roi_max_y)
+                    for channel in (px_array_r, px_array_g, px_array_b)]
+        result = detectors.runDetection(self.variant, *channels, roi_max_x - roi_min_x + 1, roi_max_y - roi_min_y + 1, self.parameters)
+        if not isConfidentDetection(result, self.ratioMin, self.ratioMax):
+            return None
+        min_x, max_x, min_y, max_y = result["bbox"]
+        # a plate cut off by the region border may continue outside of it
+        if (min_x <= 0 and roi_min_x > 0) or (min_y <= 0 and roi_min_y > 0) \
+                or (max_x >= roi_max_x - roi_min_x and roi_max_x < image_width - 1) \
+                or (max_y >= roi_max_y - roi_min_y and roi_max_y < image_height - 1):
+            return None
+        area_change = boundingBoxArea(result["bbox"]) / boundingBoxArea(self.previous["bbox"])
+        if not 1 / MAX_AREA_CHANGE <= area_change <= MAX_AREA_CHANGE:
+            return None
+        return offsetResult(result, roi_min_x, roi_min_y)
+
+    # Detects the plate in the next frame, returns the json result with the frame number, the path that produced it
+    # ("full", "refresh", "roi" or "miss" for a region search that fell back to the full frame) and the region searched
+    def process(self, px_array_r, px_array_g, px_array_b, image_width, image_height):
+        roi = None
+        if self.previous is None:
+            path = "full"
+            result = self.detectFull(px_array_r, px_array_g, px_array_b, image_width, image_height)
+        elif self.frames_since_full + 1 >= self.refreshInterval:
+            path = "refresh"
+            result = self.detectFull(px_array_r, px_array_g, px_array_b, image_width, image_height)
+        else:
+            roi = expandBoundingBox(self.previous["bbox"], image_width, image_height)
+            result = self.detectInRegion(px_array_r, px_array_g, px_array_b, image_width, image_height, roi)
+            if result is not None:
+                path = "roi"
+                self.frames_since_full += 1
+            else:
+                path = "miss"
+                result = self.detectFull(px_array_r, px_array_g, px_array_b, image_width, image_height)
+
+        self.previous = result if isConfidentDetection(result, self.ratioMin, self.ratioMax) else None
+        result["frame"] = self.frame
+        result["path"] = path
+        result["roi"] = list(roi) if roi is not None else None
+        self.frame += 1
+        return result
+
+# Simulates a video by panning a window over an image: frame i is the window moved by i * step pixels
+def simulatePanningFrames(px_array_r, px_array_g, px_array_b, image_width, image_height, frame_count, step):
+    window_width = image_width - step * (frame_count - 1)
+    if window_width <= 0:
+        raise ValueError("the image is too narrow for {} frames of {} pixels".format(frame_count, step))
+    for i in range(frame_count):
+        offset = i * step
+        yield (tuple(pyramid.cropPixelArray(channel, offset, offset + window_width - 1, 0, image_height - 1)
+                     for channel in (px_array_r, px_array_g, px_array_b)), window_width, image_height)
+
+# Tracks the plate through a sequence of frames given as png files, or through frames panned over one image,
+# and prints one json line per frame followed by the time spent on each path
+def main():
+    parser = argparse.ArgumentParser(description="Track a plate through consecutive frames")
+    parser.add_argument("frames", nargs="*", help="png files of consecutive frames")
+    parser.add_argument("--simulate", metavar="IMAGE", help="pan a window over IMAGE instead of reading frames")
+    parser.add_argument("--frame-count", type=int, default=10, help="frames to simulate")
+    parser.add_argument("--step", type=int, default=4, help="pixels the simulated window moves per frame")
+    parser.add_argument("--variant", default="detection", choices=sorted(detectors.VARIANTS))
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a detector parameter")
+    parser.add_argument("--refresh", type=int, default=DEFAULT_REFRESH_INTERVAL, help="search the full frame every N frames")
+    args = parser.parse_args()
+
+    try:
+        parameters = detectors.parseParameters(args.variant, args.set)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.simulate:
+        (image_width, image_height, px_array_r, px_array_g, px_array_b) = detectors.readRGBImageFile(args.simulate)
+        frames = simulatePanningFrames(px_array_r, px_array_g, px_array_b, image_width, image_height, args.frame_count, args.step)
+    elif args.frames:
+        frames = ((channels[2:], channels[0], channels[1]) for channels in map(detectors.readRGBImageFile, args.frames))
+    else:
+        parser.error("give frame files or --simulate IMAGE")
+
+    tracker = PlateTracker(args.variant, parameters, args.refresh)
+    path_times = {}
+    for channels, frame_width, frame_height in frames:
+        start = time.perf_counter()
+        result = tracker.process(*channels, frame_width, frame_height)
+        elapsed = time.perf_counter() - start
+        path_times.setdefault(result["path"], []).append(elapsed)
+        result["milliseconds"] = round(elapsed * 1000, 1)
+        print(json.dumps(result))
+        sys.stdout.flush()
+
+    for path, times in path_times.items():
+        print("{:<8} {:>4} frames, median {:.0f} ms".format(path, len(times), statistics.median(times) * 1000), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
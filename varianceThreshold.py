@@ -0,0 +1,161 @@
+# Fused standard deviation, contrast stretch and threshold.
+# The detectors compute the 5x5 standard deviation of every pixel (a float image), stretch it to 0..255 (an integer
+# image) and threshold that, all to get one binary image. The square root and the stretch are monotonic, so the
+# threshold can be moved back into the variance domain instead: the variance of every window comes out of sliding
+# integer sums of the values and their squares, exact and without a square root, and only the pixels whose variance
+# lies within rounding distance of the threshold (and the windows deciding the stretch range) are recomputed with
+# the float formula of computeStandardDeviationImage5x5. The binary image is therefore identical to the one of the
+# three separate stages, only five rows of window sums are held at a time.
+
+import math
+from collections import deque
+from operator import add, sub
+
+# relative distance from the threshold within which the float rounding of the original stages could tip the result
+BOUNDARY_TOLERANCE = 1e-9
+
+# The standard deviation of the 5x5 window around x, y exactly as computeStandardDeviationImage5x5 computes it,
+# pixel_array holds the image rows from first_row on
+def computeStandardDeviation5x5At(pixel_array, image_width, image_height, x, y, first_row = 0):
+    mylist = []
+    for j in range(-2, 3):
+        for k in range(-2, 3):
+            if(y+k>=0 and x+j>=0 and y+k<image_height and x+j<image_width):
+                mylist.append(pixel_array[y+k-first_row][x+j])
+    length = len(mylist)
+    mean = sum(mylist)/length
+    for i in range(length):
+        mylist[i] = (mylist[i] - mean) ** 2
+    variance = sum(mylist)/length
+    return math.sqrt(variance)
+
+# Yields, row by row, the variance of every 5x5 window (clipped at the border) as a float computed from exact
+# integer sums, together with the image rows the windows cover and the index of the first of them. rows can be
+# a pixel array or any iterator over the image rows, only five of them are held at a time. The window sums are
+# updated incrementally, a new row only adds its horizontal sums and removes those of the row that left the window.
+def iterateWindowVariances(rows, image_width, image_height):
+    # horizontal window bounds of every column
+    starts = [max(0, x - 2) for x in range(image_width)]
+    ends = [min(image_width, x + 3) for x in range(image_width)]
+    column_counts = [end - start for start, end in zip(starts, ends)]
+
+    def horizontalSums(row):
+        prefix = [0]
+        prefix_squares = [0]
+        total = 0
+        total_squares = 0
+        for value in row:
+            total += value
+            total_squares += value * value
+            prefix.append(total)
+            prefix_squares.append(total_squares)
+        sums = list(map(sub, map(prefix.__getitem__, ends), map(prefix.__getitem__, starts)))
+        squares = list(map(sub, map(prefix_squares.__getitem__, ends), map(prefix_squares.__getitem__, starts)))
+        return sums, squares
+
+    rows = iter(rows)
+    window = deque()
+    window_sums = [0] * image_width
+    window_squares = [0] * image_width
+    next_row = 0
+    for y in range(image_height):
+        # slide the window down to rows y-2..y+2
+        while next_row < min(image_height, y + 3):
+            row = next(rows)
+            sums, squares = horizontalSums(row)
+            window.append((row, sums, squares))
+            window_sums = list(map(add, window_sums, sums))
+            window_squares = list(map(add, window_squares, squares))
+            next_row += 1
+        first_row = max(0, y - 2)
+        while len(window) > next_row - first_row:
+            row, sums, squares = window.popleft()
+            window_sums = list(map(sub, window_sums, sums))
+            window_squares = list(map(sub, window_squares, squares))
+        row_count = next_row - first_row
+        variances = [(n * s2 - s1 * s1) / (n * n) for n, s1, s2 in
+                     zip([row_count * count for count in column_counts], window_sums, window_squares)]
+        yield variances, [entry[0] for entry in window], first_row
+
+# Finds the float standard deviations that span the stretch in one pass over the rows: the extremes of the exact
+# variances are tracked together with the float standard deviation of every window within rounding distance of
+# them, recomputed with the original formula while its rows are at hand. Returns smallest and largest.
+def computeStretchRange(rows, image_width, image_height):
+    smallest_variance = math.inf
+    largest_variance = -math.inf
+    smallest_windows = []
+    largest_windows = []
+    for y, (variances, window_rows, first_row) in enumerate(iterateWindowVariances(rows, image_width, image_height)):
+        row_smallest = min(variances)
+        row_largest = max(variances)
+        # a window without any variance holds one value only, the original formula gives exactly 0.0 for it
+        # and nothing can be smaller, so no windows need to be kept from then on
+        if smallest_variance > 0 and row_smallest <= smallest_variance * (1 + BOUNDARY_TOLERANCE) + BOUNDARY_TOLERANCE:
+            smallest_variance = min(smallest_variance, row_smallest)
+            limit = smallest_variance * (1 + BOUNDARY_TOLERANCE) + BOUNDARY_TOLERANCE
+            smallest_windows = [window for window in smallest_windows if window[0] <= limit]
+            if smallest_variance == 0:
+                smallest_windows = []
+            else:
+                smallest_windows.extend((variance, computeStandardDeviation5x5At(window_rows, image_width, image_height, x, y, first_row))
+                                        for x, variance in enumerate(variances) if variance <= limit)
+        if row_largest >= largest_variance * (1 - BOUNDARY_TOLERANCE):
+            largest_variance = max(largest_variance, row_largest)
+            limit = largest_variance * (1 - BOUNDARY_TOLERANCE)
+            largest_windows = [window for window in largest_windows if window[0] >= limit]
+            # as long as all windows are flat there is nothing to recompute either
+            if largest_variance > 0:
+                largest_windows.extend((variance, computeStandardDeviation5x5At(window_rows, image_width, image_height, x, y, first_row))
+                                       for x, variance in enumerate(variances) if variance >= limit)
+
+    smallest = 0.0 if smallest_variance == 0 else min(sd for variance, sd in smallest_windows)
+    largest = 0.0 if largest_variance == 0 else max(sd for variance, sd in largest_windows)
+    return smallest, largest
+
+# The smallest float standard deviation that reaches thresholdValue once stretched from smallest..largest to 0..255,
+# 0.0 if every pixel does and infinity if none does
+def computeVarianceCutoff(smallest, largest, thresholdValue):
+    # the stretched value round((sd - smallest) * 255 / (largest - smallest)) is an integer, so only the smallest
+    # integer threshold at or above thresholdValue matters
+    threshold = math.ceil(thresholdValue)
+    if threshold <= 0:
+        return 0.0
+    if largest == smallest:
+        return math.inf
+    m = 255/(largest - smallest)
+
+    def passes(sd):
+        return round((sd - smallest) * m) >= threshold
+
+    if not passes(largest):
+        return math.inf
+
+    # the stretch is monotonic, so everything above the cutoff passes too
+    cutoff = smallest + (threshold - 0.5) / m
+    while passes(math.nextafter(cutoff, -math.inf)):
+        cutoff = math.nextafter(cutoff, -math.inf)
+    while not passes(cutoff):
+        cutoff = math.nextafter(cutoff, math.inf)
+    return cutoff
+
+# Yields the binary rows (0 or 255) of the pixels whose standard deviation reaches cutoff, rows is a pixel array
+# or an iterator over the image rows
+def iterateVarianceThresholdRows(rows, image_width, image_height, cutoff):
+    # windows clearly above or below the cutoff in the variance domain are decided right away (-1 marks the others)
+    cutoff_variance = cutoff * cutoff
+    upper = cutoff_variance * (1 + BOUNDARY_TOLERANCE)
+    lower = cutoff_variance * (1 - BOUNDARY_TOLERANCE)
+    for y, (variances, window_rows, first_row) in enumerate(iterateWindowVariances(rows, image_width, image_height)):
+        row = [255 if variance >= upper else 0 if variance < lower else -1 for variance in variances]
+        while -1 in row:
+            x = row.index(-1)
+            sd = computeStandardDeviation5x5At(window_rows, image_width, image_height, x, y, first_row)
+            row[x] = 255 if sd >= cutoff else 0
+        yield row
+
+# Computes the binary image computeThresholdGE(scaleTo0And255AndQuantize(computeStandardDeviationImage5x5(px))) in
+# one fused stage, thresholdValue is the threshold of the stretched standard deviation (a number, not "otsu")
+def computeVarianceThresholdGE(pixel_array, thresholdValue, image_width, image_height):
+    smallest, largest = computeStretchRange(pixel_array[:image_height], image_width, image_height)
+    cutoff = computeVarianceCutoff(smallest, largest, thresholdValue)
+    return list(iterateVarianceThresholdRows(pixel_array[:image_height], image_width, image_height, cutoff))
@@ -0,0 +1,105 @@
+# Plotting and output rendering for the detectors.
+# matplotlib takes hundreds of milliseconds to import and pulls in a GUI backend, so it is only
+# imported inside the functions below that actually draw a figure. Headless runs that never ask
+# for a figure or a matplotlib rendered output image don't pay for it.
+
+import sys
+
+# import our basic, light-weight png reader library
+import imageIO.png
+
+# imports pyplot on first use, when no figure will be shown the non interactive Agg backend is selected
+def loadPyplot(show_figure):
+    import matplotlib
+    if not show_figure and "matplotlib.pyplot" not in sys.modules:
+        matplotlib.use("Agg")
+    from matplotlib import pyplot
+    return pyplot
+
+# Draws the r,g,b input channels and the final detection into a 2x2 figure, writes the detection part
+# of the figure into output_filename and optionally shows the figure.
+# The plates are given either as bboxes, a list of (min_x, max_x, min_y, max_y), or as polygons, a list of 4 point lists.
+def saveDetectionFigure(px_array_r, px_array_g, px_array_b, px_array, output_filename, show_figure, bboxes=(), polygons=()):
+    pyplot = loadPyplot(show_figure)
+    from matplotlib.patches import Polygon, Rectangle
+
+    # setup the plots for intermediate results in a figure
+    fig1, axs1 = pyplot.subplots(2, 2)
+    axs1[0, 0].set_title('Input red channel of image')
+    axs1[0, 0].imshow(px_array_r, cmap='gray')
+    axs1[0, 1].set_title('Input green channel of image')
+    axs1[0, 1].imshow(px_array_g, cmap='gray')
+    axs1[1, 0].set_title('Input blue channel of image')
+    axs1[1, 0].imshow(px_array_b, cmap='gray')
+
+    # Draw the bounding boxes into the input image
+    axs1[1, 1].set_title('Final image of detection')
+    axs1[1, 1].imshow(px_array, cmap='gray')
+    for bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y in bboxes:
+        rect = Rectangle((bbox_min_x, bbox_min_y), bbox_max_x - bbox_min_x, bbox_max_y - bbox_min_y, linewidth=1,
+                         edgecolor='g', facecolor='none')
+        axs1[1, 1].add_patch(rect)
+    for polygon in polygons:
+        rect = Polygon(polygon, linewidth=1, closed=True, edgecolor='g', facecolor='none')
+        axs1[1, 1].add_patch(rect)
+
+    # write the output image into output_filename, using the matplotlib savefig method
+    extent = axs1[1, 1].get_window_extent().transformed(fig1.dpi_scale_trans.inverted())
+    pyplot.savefig(output_filename, bbox_inches=extent, dpi=600)
+
+    if show_figure:
+        # plot the current figure
+        pyplot.show()
+    else:
+        pyplot.close(fig1)
+
+# Returns the integer points on the line from a to b (Bresenham)
+def computeLinePoints(a, b):
+    x0, y0 = int(round(a[0])), int(round(a[1]))
+    x1, y1 = int(round(b[0])), int(round(b[1]))
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    error = dx + dy
+    points = []
+    while True:
+        points.append((x0, y0))
+        if x0 == x1 and y0 == y1:
+            return points
+        e2 = 2 * error
+        if e2 >= dy:
+            error += dy
+            x0 += sx
+        if e2 <= dx:
+            error += dx
+            y0 += sy
+
+# True for the sentinel box of a frame without a plate, e.g. (width, 0, height, 0), min_x is right of max_x
+def isEmptyBoundingBox(bbox):
+    return bbox[0] > bbox[1]
+
+# Converts a bounding box (min_x, max_x, min_y, max_y) into a polygon of its 4 corners
+def boundingBoxPolygon(bbox):
+    bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y = bbox
+    return [(bbox_min_x, bbox_min_y), (bbox_max_x, bbox_min_y), (bbox_max_x, bbox_max_y), (bbox_min_x, bbox_max_y)]
+
+# Writes the greyscale px_array with the plate outlines (a list of polygons) drawn in green as an RGB png without
+# matplotlib. This is the fast output path for headless batch processing, the image keeps the input resolution.
+def writeDetectionPNG(px_array, image_width, image_height, output_filename, polygons):
+    rows = []
+    for y in range(image_height):
+        row = []
+        for value in px_array[y]:
+            row.extend((value, value, value))
+        rows.append(row)
+
+    for polygon in polygons:
+        for i in range(len(polygon)):
+            for x, y in computeLinePoints(polygon[i], polygon[(i + 1) % len(polygon)]):
+                if 0 <= x < image_width and 0 <= y < image_height:
+                    rows[y][3 * x:3 * x + 3] = (0, 255, 0)
+
+    writer = imageIO.png.Writer(image_width, image_height, greyscale=False)
+    with open(output_filename, "wb") as output_file:
+        writer.write(output_file, rows)
@@ -0,0 +1,232 @@
+# Sharded batch processing over a shared directory, for any number of workers on any number of machines that
+# only share a filesystem. The image list is cut into shards once:
+#   python workQueue.py init QUEUE_DIR images... [--shard-size 100] [--variant extension] [--set NAME=VALUE]
+# then every node starts workers that take shards until none are left:
+#   python workQueue.py work QUEUE_DIR [--workers N]
+# and the coordinator merges the per shard results once all shards are done:
+#   python workQueue.py merge QUEUE_DIR [--output results.jsonl]
+#
+# A shard moves from pending/ to leased/ by an atomic rename, so exactly one worker gets it. The worker touches the
+# leased file after every image, a lease whose file wasn't touched for --lease-seconds is taken to belong to a dead
+# worker and the shard is renamed back to pending/. The results of a shard are written to a temporary file in
+# results/ and renamed into place once the shard is complete, then the shard moves to done/. A worker whose lease
+# was taken away notices when it can't touch the leased file any more and drops the shard.
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import archiveInput
+import detectors
+import multirun
+
+DEFAULT_SHARD_SIZE = 100
+DEFAULT_LEASE_SECONDS = 600
+
+# seconds an idle worker waits before looking for expired leases again while other workers hold shards
+POLL_SECONDS = 5
+
+QUEUE_CONFIG = "queue.json"
+STATES = ["pending", "leased", "done", "results"]
+
+# Converts an image source of the batch runner to json data and back, archive members become
+# [archive, member, offset, size]
+def sourceToJSON(source):
+    if isinstance(source, archiveInput.ArchiveMember):
+        return list(source)
+    return source
+
+def sourceFromJSON(data):
+    if isinstance(data, list):
+        return archiveInput.ArchiveMember(*data)
+    return data
+
+# Name of the file of a shard
+def shardFilename(index):
+    return "shard-{:06d}.json".format(index)
+
+# Writes a file so that readers only ever see it complete
+def writeAtomically(path, text):
+    temporary = "{}.tmp-{}-{}".format(path, socket.gethostname(), os.getpid())
+    with open(temporary, "w") as output_file:
+        output_file.write(text)
+        output_file.flush()
+        os.fsync(output_file.fileno())
+    os.replace(temporary, path)
+
+# Creates the queue directory with the variant, the parameter settings and the image sources cut into shards.
+# Paths are made absolute, the workers may run in other working directories.
+def initQueue(queue_dir, sources, variant, settings, shard_size = DEFAULT_SHARD_SIZE):
+    for state in STATES:
+        os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+    sources = [source._replace(archive=os.path.abspath(source.archive))
+               if isinstance(source, archiveInput.ArchiveMember) else os.path.abspath(source) for source in sources]
+    shards = [sources[start:start + shard_size] for start in range(0, len(sources), shard_size)]
+    for index, shard in enumerate(shards):
+        writeAtomically(os.path.join(queue_dir, "pending", shardFilename(index)), json.dumps([sourceToJSON(source) for source in shard]))
+    writeAtomically(os.path.join(queue_dir, QUEUE_CONFIG), json.dumps({"variant": variant, "settings": settings, "shards": len(shards)}))
+    return len(shards)
+
+# Renames the shards of leases that weren't renewed for lease_seconds back to pending, returns how many
+def reclaimExpiredLeases(queue_dir, lease_seconds):
+    reclaimed = 0
+    leased_dir = os.path.join(queue_dir, "leased")
+    for name in sorted(os.listdir(leased_dir)):
+        path = os.path.join(leased_dir, name)
+        try:
+            if time.time() - os.stat(path).st_mtime > lease_seconds:
+                os.rename(path, os.path.join(queue_dir, "pending", name))
+                reclaimed += 1
+        except FileNotFoundError:
+            # finished or reclaimed by another worker meanwhile
+            pass
+    return reclaimed
+
+# Takes the first pending shard that no other worker takes at the same time, returns its name or None
+def claimShard(queue_dir):
+    for name in sorted(os.listdir(os.path.join(queue_dir, "pending"))):
+        if not name.endswith(".json"):
+            continue
+        leased = os.path.join(queue_dir, "leased", name)
+        try:
+            os.rename(os.path.join(queue_dir, "pending", name), leased)
+        except FileNotFoundError:
+            continue
+        # the rename keeps the modification time of the pending file, the lease starts now
+        os.utime(leased)
+        return name
+    return None
+
+# Runs the detection over one leased shard and publishes its results, returns False if the lease was lost
+def processShard(queue_dir, name, variant, parameters, prefetch, decoders):
+    leased = os.path.join(queue_dir, "leased", name)
+    with open(leased) as shard_file:
+        sources = [sourceFromJSON(data) for data in json.load(shard_file)]
+
+    result_path = os.path.join(queue_dir, "results", name.replace(".json", ".jsonl"))
+    temporary = "{}.tmp-{}-{}".format(result_path, socket.gethostname(), os.getpid())
+    with open(temporary, "w") as output_file:
+        for result in multirun.processBatch(sources, variant, parameters, prefetch, decoders):
+            output_file.write(json.dumps(result) + "\n")
+            try:
+                os.utime(leased)
+            except FileNotFoundError:
+                break
+        else:
+            output_file.flush()
+            os.fsync(output_file.fileno())
+    if not os.path.exists(leased):
+        os.remove(temporary)
+        return False
+    os.replace(temporary, result_path)
+    try:
+        os.rename(leased, os.path.join(queue_dir, "done", name))
+    except FileNotFoundError:
+        # reclaimed right after the last image, the results are complete anyway
+        pass
+    return True
+
+# Reads the queue configuration, returns variant, parameters and shard count
+def readQueueConfig(queue_dir):
+    with open(os.path.join(queue_dir, QUEUE_CONFIG)) as config_file:
+        config = json.load(config_file)
+    return config["variant"], detectors.parseParameters(config["variant"], config["settings"]), config["shards"]
+
+# Counts the shards in every state
+def queueStatus(queue_dir):
+    return {state: sum(1 for name in os.listdir(os.path.join(queue_dir, state)) if name.endswith(".json"))
+            for state in ["pending", "leased", "done"]}
+
+# Worker loop: takes shards until all of them are done, returns the number of shards it completed
+def runQueueWorker(queue_dir, lease_seconds = DEFAULT_LEASE_SECONDS, prefetch = multirun.DEFAULT_PREFETCH, decoders = multirun.DEFAULT_DECODERS):
+    variant, parameters, shard_count = readQueueConfig(queue_dir)
+    worker = "{}-{}".format(socket.gethostname(), os.getpid())
+    completed = 0
+    while True:
+        name = claimShard(queue_dir)
+        if name is None:
+            if reclaimExpiredLeases(queue_dir, lease_seconds) > 0:
+                continue
+            if queueStatus(queue_dir)["leased"] == 0:
+                return completed
+            # other workers still hold shards, one of them may die and leave its shard to us
+            time.sleep(POLL_SECONDS)
+            continue
+        start = time.perf_counter()
+        if processShard(queue_dir, name, variant, parameters, prefetch, decoders):
+            completed += 1
+            print("{} finished {} in {:.1f} s".format(worker, name, time.perf_counter() - start), file=sys.stderr)
+        else:
+            print("{} lost the lease of {}".format(worker, name), file=sys.stderr)
+
+# Concatenates the results of all shards in shard order into output_file, returns the number of results
+def mergeResults(queue_dir, output_file):
+    variant, parameters, shard_count = readQueueConfig(queue_dir)
+    count = 0
+    for index in range(shard_count):
+        with open(os.path.join(queue_dir, "results", shardFilename(index).replace(".json", ".jsonl"))) as shard_results:
+            for line in shard_results:
+                output_file.write(line)
+                count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded batch detection through a shared directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init_parser = commands.add_parser("init", help="cut the images into shards")
+    init_parser.add_argument("queue_dir")
+    init_parser.add_argument("images", nargs="+", help="png files and zip or tar archives of pngs")
+    init_parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    init_parser.add_argument("--variant", default="detection", choices=sorted(detectors.VARIANTS))
+    init_parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a detector parameter")
+    work_parser = commands.add_parser("work", help="process shards until none are left")
+    work_parser.add_argument("queue_dir")
+    work_parser.add_argument("--workers", type=int, default=1, help="worker processes on this node")
+    work_parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                             help="a shard whose worker made no progress for this long is handed out again")
+    work_parser.add_argument("--prefetch", type=int, default=multirun.DEFAULT_PREFETCH)
+    work_parser.add_argument("--decoders", type=int, default=multirun.DEFAULT_DECODERS)
+    status_parser = commands.add_parser("status", help="count the pending, leased and done shards")
+    status_parser.add_argument("queue_dir")
+    merge_parser = commands.add_parser("merge", help="merge the results once all shards are done")
+    merge_parser.add_argument("queue_dir")
+    merge_parser.add_argument("--output", help="json lines file (default stdout)")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        try:
+            detectors.parseParameters(args.variant, args.set)
+            sources = archiveInput.expandArchives(args.images)
+        except (ValueError, OSError) as error:
+            parser.error(str(error))
+        shard_count = initQueue(args.queue_dir, sources, args.variant, args.set, args.shard_size)
+        print("{} images in {} shards".format(len(sources), shard_count), file=sys.stderr)
+    elif args.command == "work":
+        worker_args = (args.queue_dir, args.lease_seconds, args.prefetch, args.decoders)
+        if args.workers <= 1:
+            runQueueWorker(*worker_args)
+        else:
+            processes = [multiprocessing.Process(target=runQueueWorker, args=worker_args) for i in range(args.workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+    elif args.command == "status":
+        print(json.dumps(queueStatus(args.queue_dir)))
+    else:
+        status = queueStatus(args.queue_dir)
+        if status["pending"] or status["leased"]:
+            sys.exit("not all shards are done yet: {}".format(json.dumps(status)))
+        if args.output:
+            with open(args.output, "w") as output_file:
+                count = mergeResults(args.queue_dir, output_file)
+        else:
+            count = mergeResults(args.queue_dir, sys.stdout)
+        print("merged {} results".format(count), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()